@@ -1,443 +1,371 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import os
+import json
+import functools
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from procurement import query, store
+from procurement.charts import (
+    MAX_FIGURE_BYTES, PERFORMANCE_CHARTS, duration_means_figure, duration_totals_figure, figure_payload_bytes,
+    figure_points, monthly_totals, performance_figure, quantity_figures, summary_figure, threshold_figure,
+)
+from procurement.export import EXPORT_DOWNLOAD_MAX_MB, EXPORT_FORMATS, export_filtered
+from procurement.filters import SIDEBAR_FILTERS, default_selections, filter_key, filter_state
+from procurement.id_index import ID_SEARCH_COLUMNS
+from procurement.ingest import content_hash, files_hash, load_extracts
+from procurement.metrics import (
+    OVERVIEW_COUNTS, QUANTITY_TOTALS, durations_frame, load_kpis, quantity_totals, threshold_counts,
+)
+from procurement.perf import PerfRecorder
+from procurement.schema import AGING_COLUMNS, DURATION_COLUMNS
+from procurement.shared import SharedCache, SharedDataset, combine_masks
+from procurement.stats import duration_stats
 
-# Configuration de la page
-st.set_page_config(page_title="CARE DRC PROCUREMENT STATUS DASHBOARD", layout="wide")
+# Copy-on-Write : les extraits partagés entre sessions ne sont jamais modifiés à travers une vue
+pd.set_option("mode.copy_on_write", True)
 
-# Chargement du logo
-logo_path = "images.png"
-if os.path.exists(logo_path):
-    st.image(logo_path, width=150)
 
-# En-tête
-st.title("CARE DRC PROCUREMENT STATUS DASHBOARD")
-st.markdown("**Auteur : CARE DRC | Conception : Michel Kamwanga | Contribution technique : Bennet Shabani**")
+@st.cache_resource
+def cache_partage():
+    # Un seul cache par processus : toutes les sessions lisent le même extrait et les mêmes index
+    return SharedCache()
 
-# Chargement des données
-uploaded_file = st.file_uploader("Chargez un fichier Excel extrait de Peoplesoft. Ne changez pas les noms de colonnes ", type=["xls", "csv","xlsx"])
-if uploaded_file:
-    df = pd.read_excel(uploaded_file)
-    
-    # Mapping des valeurs de la colonne 'Dept ID'
-    dept_mapping = {
-        "CD0001": "Kinshasa", "CD0002": "Goma", "CD-SPC": "Congo SPC",
-        "CD0003": "Kasongo", "CD0004": "Kindu", "CD0005": "Butembo", "CD0006": "Beni",
-        "CD0007": "Lubero", "CD0008": "Kirumba", "CD0009": "Mbujimayi", "CD0010": "Kalima",
-        "CD0013": "Uvira", "CD0014": "Mweneditu"
-    }
-    df['Dept ID'] = df['Dept ID'].map(dept_mapping)
 
-    # Sidebar pour les filtres
-    with st.sidebar:
-        st.header("Filtres")
-        options = df['Dept ID'].dropna().unique()
-        bureau = st.multiselect("Bureau", options=options, default=options)
-        projet = st.multiselect("Projet", df['Fund Code'].dropna().unique(), default=df['Fund Code'].unique())
-        project_id = st.multiselect("Project ID", df['Project ID'].dropna().unique(), default=df['Project ID'].unique())
-        buyer_options = df['PO Buyer'].dropna().unique()  # Supprimer les NaN
-        buyer_id = st.multiselect("PO Buyer", buyer_options, default=[])
-        annee = st.multiselect("Année", df['PR-Year'].dropna().unique(), default=df['PR-Year'].unique())
-        statut_pr = st.multiselect("Statut du PR", df['PR Status'].dropna().unique(), default=df['PR Status'].unique())
-        devise = st.multiselect("Devise", df['Currency'].dropna().unique(), default=df['Currency'].unique())
-        requisition = st.multiselect("Requisition/DA", df['Requisition ID'].dropna().unique(), default=[])
-        po = st.multiselect("PO/RFQ", df['RFQ ID'].dropna().unique(), default=[])
-        voucher = st.multiselect("Voucher", df['Voucher ID'].dropna().unique(), default=[])
-        prstatus = st.multiselect("PR Status", df['PR Status'].dropna().unique(), default=[])
-        postatus = st.multiselect("PO Status", df['PO Status'].dropna().unique(), default=[])
-
-    
-    # Appliquer les filtres
-    if bureau:
-        df = df[df['Dept ID'].isin(bureau)]
-    if projet:
-        df = df[df['Fund Code'].isin(projet)]
-    if project_id:
-        df = df[df['Project ID'].isin(project_id)]
-    if buyer_id:
-        df = df[df['PO Buyer'].isin(buyer_id)]
-    if annee:
-        df = df[df['PR-Year'].isin(annee)]
-    if statut_pr:
-        df = df[df['PR Status'].isin(statut_pr)]
-    if devise:
-        df = df[df['Currency'].isin(devise)]
-    if requisition:
-        df = df[df['Requisition ID'].isin(requisition)]
-    if po:
-        df = df[df['RFQ ID'].isin(po)]
-    if voucher:
-        df = df[df['Voucher ID'].isin(voucher)]
-    if prstatus:
-        df = df[df['PR Status'].isin(prstatus)]
-    if postatus:
-        df = df[df['PO Status'].isin(postatus)]
+def charger_extrait(digest, fichiers):
+    # Un extrait déjà analysé dans ce processus, par n'importe quelle session, est réutilisé tel quel
+    with st.spinner("Chargement de l'extrait PeopleSoft..."):
+        return cache_partage().get(digest, lambda: SharedDataset(load_extracts(fichiers, digest=digest)[1]))
 
-    # Style CSS personnalisé
-    st.markdown("""
-        <style>
-            .metric-container {
-                background-color: orange;
-                border: 2px solid green;
-                border-radius: 10px;
-                padding: 15px;
-                text-align: center;
-                font-weight: bold;
-                color: white;
-                font-size: 15px;
-            }
-            .metric-value {
-                font-size: 30px;
-                font-weight: bold;
-            }
-        </style>
-    """, unsafe_allow_html=True)
-    
-    # Fonction pour afficher les métriques avec style
-    def display_metric(label, value, col):
-        col.markdown(f"""
-            <div class='metric-container'>
-                <div class='metric-value'>{value}</div>
-                <div>{label}</div>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    # OVERVIEW
-    st.subheader("OVERVIEW")
-    with st.container():
-        col1, col2, col3, col4, col5, col6, col7 = st.columns(7)
-        display_metric("Réquisitions", df['Requisition ID'].nunique(), col1)
-        display_metric("Nombre RFQ", df['RFQ ID'].nunique(), col2)
-        display_metric("Nombre PO", df['PO No.'].nunique(), col3)
-        display_metric("PO Reçu", df['Receipt Nbr'].nunique(), col4)
-        display_metric("Nb vouchers", df['Voucher ID'].nunique(), col5)
-        display_metric("Nb Paiements", df['Vch Pymt Ref'].nunique(), col6)
-        display_metric("Paiements", df['Vch Last Approver'].nunique(), col7)
 
-    st.subheader("")
-    with st.container():
-        col1, col2, col3, col4 = st.columns(4)
-        display_metric("Quantités commandées", f"{int(df['Quantity Ordered'].sum()):,}".replace(","," "), col1)
-        display_metric("Quantités recues", f"{int(df['Quantity Received'].sum()):,}".replace(","," "), col2)
-        display_metric("Balance", f"{int(df['Balance Pending to be Rcvd'].sum()):,}".replace(","," "), col3)
-        display_metric("Valeurs engagées", f"${int(df['Item Total'].sum()):,}".replace(",", " "), col4)
+# Colonnes lues par le suivi d'une demande
+COLONNES_SUIVI = ["PR Item", "Quantity Ordered", "Quantity Received", "Balance", "RFQ ID", "PO No.",
+                  "PO Aging", "PR Aging", "VCH Aging", "RC Aging"]
+# Historique interrogé par DuckDB : les indicateurs et les graphiques sont calculés sur les partitions,
+# seules les colonnes des filtres, de la date et du suivi restent en mémoire
+COLONNES_REQUETES = list(dict.fromkeys([col for _, col, _ in SIDEBAR_FILTERS] + ['Date'] + COLONNES_SUIVI))
 
-    # Assurer que les colonnes 'PR-Year' et 'PR-Month' sont bien des entiers
-    df['PR-Year'] = df['PR-Year'].astype(int)
-    df['PR-Month'] = df['PR-Month'].astype(int)
 
-    # Créer une colonne 'Date' combinant 'PR-Year' et 'PR-Month' avec un jour fixe (par exemple, 1er du mois)
-    df['Date'] = pd.to_datetime(df['PR-Year'].astype(str) + '-' + df['PR-Month'].astype(str) + '-01')
+def charger_historique(digest, annees, bureaux, partiel=False):
+    # Seules les partitions des années et bureaux choisis sont lues ; aucune sélection = tout l'historique
+    def charger():
+        df = store.load(annees or None, bureaux or None, columns=COLONNES_REQUETES if partiel else None)
+        # Aucune partition pour ces années et bureaux : rien à partager ni à mettre en cache
+        return None if df is None else SharedDataset(df)
 
-    # Assurer qu'il n'y a pas de valeurs NaN dans la nouvelle colonne 'Date'
-    df = df.dropna(subset=['Date'])
+    with st.spinner("Lecture de l'historique..."):
+        return cache_partage().get(f"{digest}:colonnes" if partiel else digest, charger)
 
-    with st.container():
-        col1, col2 = st.columns(2)
-        
-        # Graphique pour les Quantités Commandées avec des barres plus grosses
-        fig1 = px.bar(df, x='Date', y='Quantity Ordered', title="Quantités Commandées", labels={'Date': 'Date', 'Quantity Ordered': 'Quantité Commandée'})
-        fig1.update_layout(
-            xaxis_title='Mois',
-            yaxis_title='Quantité Commandée',
-            xaxis_tickformat="%b %Y", 
-            template='plotly_dark',
-            barmode='group',
-            xaxis_tickangle=45,  # Angles de rotation des ticks de l'axe X
-            bargap=0.2,  # Espacement entre les barres
-            legend_title="Légende",  # Titre de la légende
-            legend=dict(
-                x=1,  # Position horizontale de la légende
-                y=1,  # Position verticale de la légende
-                traceorder='normal',  # Ordre des éléments de la légende
-                font=dict(size=14),  # Taille de la police de la légende
-                bgcolor='rgba(255, 255, 255, 0.5)',  # Couleur de fond de la légende
-                bordercolor='red',  # Bordure de la légende
-                borderwidth=2  # Largeur de la bordure de la légende
-            )
-        )
-        col1.plotly_chart(fig1, use_container_width=True)
-
-        # Graphique pour les Quantités Reçues avec des barres plus grosses
-        fig2 = px.bar(df, x='Date', y='Quantity Received', title="Quantités Reçues", labels={'Date': 'Date', 'Quantity Received': 'Quantité Reçue'})
-        fig2.update_layout(
-            xaxis_title='Mois',
-            yaxis_title='Quantité Reçue',
-            xaxis_tickformat="%b %Y", 
-            template='plotly_dark',
-            barmode='group',
-            xaxis_tickangle=40,  # Angles de rotation des ticks de l'axe X
-            bargap=0.2,  # Espacement entre les barres
-            legend_title="Légende",  # Titre de la légende
-            legend=dict(
-                x=1,  # Position horizontale de la légende
-                y=1,  # Position verticale de la légende
-                traceorder='normal',  # Ordre des éléments de la légende
-                font=dict(size=14),  # Taille de la police de la légende
-                bgcolor='rgba(215, 285, 255, 0.5)',  # Couleur de fond de la légende
-                bordercolor='red',  # Bordure de la légende
-                borderwidth=2  # Largeur de la bordure de la légende
-            )
-        )
-        col2.plotly_chart(fig2, use_container_width=True)
-###################################################################
-        st.title("Seuil d'approbation des PO")
-
-        threshold_1_count = df['Threshold 1'].value_counts()
-        fig_threshold_1 = px.bar(threshold_1_count, x=threshold_1_count.index, y=threshold_1_count.values,
-                                title="Occurrences de 'Threshold 1'", labels={'x': 'Valeur', 'y': 'Nombre d\'occurrences'})
-        fig_threshold_1.update_traces(
-            text=threshold_1_count.values,
-            textposition='outside',
-            texttemplate='%{text}'
-        )
-
-        # Créer un graphique pour 'Threshold 2'
-        threshold_2_count = df['Threshold 2'].value_counts()
-        fig_threshold_2 = px.bar(threshold_2_count, x=threshold_2_count.index, y=threshold_2_count.values,
-                                title="Occurrences de 'Threshold 2'", labels={'x': 'Valeur', 'y': 'Nombre d\'occurrences'})
-        fig_threshold_2.update_traces(
-            text=threshold_2_count.values,
-            textposition='outside',
-            texttemplate='%{text}'
-        )
-
-        # Créer un graphique pour 'Threshold 3'
-        threshold_3_count = df['Threshold 3'].value_counts()
-        fig_threshold_3 = px.bar(threshold_3_count, x=threshold_3_count.index, y=threshold_3_count.values,
-                                title="Occurrences de 'Threshold 3'", labels={'x': 'Valeur', 'y': 'Nombre d\'occurrences'})
-        fig_threshold_3.update_traces(
-            text=threshold_3_count.values,
-            textposition='outside',
-            texttemplate='%{text}'
-        )
-
-        # Organiser les graphiques en 3 colonnes
-        col1, col2, col3 = st.columns(3)
-
-        with col1:
-            st.plotly_chart(fig_threshold_1)
-
-        with col2:
-            st.plotly_chart(fig_threshold_2)
-
-        with col3:
-            st.plotly_chart(fig_threshold_3)
-###################################################################
-    st.title("Visualisation des Durées des Phases d'approbation")
 
-    columns = [
-        'PR-RFQ Entry Dt', 'PR-PO EDt', 'PO-RC EDt', 'RC-VCH EDt', 'VCH-PY EDt',
-        'VCH/Inv Tran Dt to PY Entry Dt', 'PR-RC EDt', 'PR-Invoice/VCH Trans Date', 
-        'PR-VCH EDt', 'PR-PY EDt', 'PO-VCH EDt', 'PO-PY EDt', 'PR TotApprv T', 
-        'PO TotApprv T', 'VCH TotApprv T'
-    ]
+def historique_complet(digest, annees, bureaux):
+    # Toutes les colonnes, lues à la demande (export, repli pandas) ; mêmes partitions, donc mêmes lignes
+    # dans le même ordre : les masques de l'historique partiel s'appliquent tels quels
+    donnees = charger_historique(digest, annees, bureaux)
+    if donnees is None:
+        raise OSError("partitions retirées de l'historique pendant la lecture")
+    return donnees.df
 
-    # Affichage des statistiques pour chaque colonne
-    for i in range(0, len(columns), 5):  # Diviser les colonnes en groupes de 5
-        cols = columns[i:i + 5]  # Prendre un sous-ensemble de colonnes
-        col1, col2, col3, col4, col5 = st.columns(5)  # Créer 5 colonnes dans Streamlit
 
-        # Affichage des statistiques pour chaque colonne dans chaque colonne de Streamlit
-        for j, col in enumerate(cols):
-            with [col1, col2, col3, col4, col5][j]:
-                st.subheader(col)
-                st.write(f"Moyenne : {df[col].mean():.0f} jours")
-                st.write(f"Maximale : {df[col].max():.0f} jours")
-                st.write(f"Écart-type : {df[col].std():.0f} jours")
-                st.write(f"Total : {df[col].sum():.0f} jours")
-                st.write("---")
-    ####
-    # Créer un graphique global pour toutes les colonnes
-    st.header("Moyenne des Durées de jours")
+# Lignes retenues d'un extrait partagé : seules les colonnes utiles sont copiées, le temps d'une section
+def vue(df, masque, colonnes):
+    colonnes = list(dict.fromkeys(colonnes))
+    return df[colonnes] if masque is None else df.loc[masque, colonnes]
 
-    # Calculer les moyennes pour chaque colonne
-    averages = df[columns].mean()
 
-    # Créer un graphique à barres des moyennes
-    fig_avg = px.bar(averages, x=averages.index, y=averages.values)
+@st.cache_data(max_entries=64)
+def stats_durees(digest, etat_filtres, columns, _df, _masque):
+    # Mémorisé par extrait et par état des filtres : les graphiques de synthèse réutilisent le même calcul
+    return duration_stats(vue(_df, _masque, columns), columns)
 
-    # Ajouter les valeurs sur chaque barre
-    fig_avg.update_traces(
-        text=averages.values,  # Afficher les valeurs des moyennes sur les barres
-        textposition='outside',  # Placer les valeurs à l'extérieur des barres
-        texttemplate='%{text:.1f}',  # Formater les valeurs avec 2 décimales
-        showlegend=False  # Masquer la légende
-    )
 
-    fig_avg.update_layout(xaxis_title='-', yaxis_title='Moyenne en Jours')
-    st.plotly_chart(fig_avg)
+@st.cache_data(ttl=300, max_entries=256)
+def kpis_precalcules(digest, cle_filtres):
+    # Indicateurs écrits par le mode batch (python -m procurement.batch), s'il y en a pour ces filtres
+    return load_kpis(digest, cle_filtres)
 
-    # Calculer les totaux pour chaque colonne
-    totals = df[columns].sum()
 
-    # Créer un graphique à barres empilées des totaux
-    st.header("Total des Durées de jours")
+@st.cache_data(max_entries=64)
+def kpis_requete(digest, cle_filtres, source, centiles, _selections):
+    # Calculés par DuckDB sur les fichiers Parquet : seules les colonnes citées et les groupes de lignes
+    # retenus par les filtres sont lus ; les centiles des durées ne le sont que s'ils sont affichés
+    return query.kpis(source, _selections, percentiles=centiles)
+
+
+@st.cache_data(max_entries=64)
+def mensuel_requete(digest, cle_filtres, source, _selections):
+    return query.monthly_totals(source, _selections, ['Quantity Ordered', 'Quantity Received'])
+
+
+@st.cache_data(max_entries=256)
+def performances_requete(digest, cle_filtres, source, valeur, personne, _selections):
+    return query.performance_summary(source, _selections, valeur, personne)
+
+
+# Mesures de performance de la session : une ligne de journal par relance
+def profil():
+    if "profil" not in st.session_state:
+        st.session_state["profil"] = PerfRecorder()
+    return st.session_state["profil"]
 
-    fig_total = px.bar(totals, x=totals.index, y=totals.values, color=totals.index)
 
-    # Ajouter les valeurs sur chaque barre
-    fig_total.update_traces(
-        text=totals.values,  # Afficher les valeurs sur les barres
-        textposition='outside',  # Placer les valeurs à l'extérieur des barres
-        texttemplate='%{text:.0f}',  # Formater les valeurs avec 0 décimales
-        showlegend=True  # Masquer la légende
+# Fonction pour afficher un graphique en vérifiant la taille des données envoyées
+def afficher_graphique(fig, conteneur=st, titre="", **kwargs):
+    taille = figure_payload_bytes(fig)
+    profil().add_figure(titre or fig.layout.title.text or "-", figure_points(fig), taille)
+    if taille > MAX_FIGURE_BYTES:
+        conteneur.warning(f"Graphique non affiché : {taille // 1024} Ko dépassent la limite de {MAX_FIGURE_BYTES // 1024} Ko.")
+        return
+    conteneur.plotly_chart(fig, **kwargs)
+
+
+# Fonction pour afficher les métriques avec style
+def display_metric(label, value, col):
+    col.markdown(f"""
+        <div class='metric-container'>
+            <div class='metric-value'>{value}</div>
+            <div>{label}</div>
+        </div>
+    """, unsafe_allow_html=True)
+
+
+# Fonction pour afficher un graphique encadré avec un titre centré
+def display_chart_with_border(fig, title):
+    st.markdown(
+        f"""
+        <div style="
+            border: 2px solid #4CAF50;
+            border-radius: 10px;
+            padding: 15px;
+            margin-bottom: 15px;
+            box-shadow: 2px 2px 8px rgba(0,0,0,0.1);
+            background-color:rgb(34, 242, 117);
+        ">
+            <h4 style="text-align: center;">{title}</h4>
+        """,
+        unsafe_allow_html=True
     )
+    afficher_graphique(fig, titre=title, use_container_width=True)
+    st.markdown("</div>", unsafe_allow_html=True)
 
-    fig_total.update_layout(xaxis_title='Nombre des jours', yaxis_title='Total en Jours')
-    st.plotly_chart(fig_total)
-#####################################################
-    # PR STATUS - Nombre de jours
-    st.subheader("MOYENNE D'AGE")
-    with st.container():
-        col1, col2, col3, col4 = st.columns(4)
-        display_metric("Moyenne Age PR", f"{int(df['PR Aging'].mean()):,} Jour.s".replace(",", " "), col1)
-        display_metric("Moyenne Age PO", f"{int(df['PO Aging'].mean()):,} Jour.s".replace(",", " "), col2)
-        display_metric("Moyenne Age RC", f"{int(df['RC Aging'].mean()):,} Jour.s".replace(",", " "), col3)
-        display_metric("Moyenne Age VCH", f"{int(df['VCH Aging'].mean()):,} Jour.s".replace(",", " "), col4)
-    
-    
-    st.markdown("<br>", unsafe_allow_html=True)  # Un saut de ligne
-    st.divider()
-    st.header("PROCUREMENT PERFORMANCES")
-    
-    # Fonction pour afficher un graphique encadré
-    def display_chart_with_border(fig, title):
-        st.markdown(
-            f"""
-            <div style="
-                border: 2px solid #4CAF50;
-                border-radius: 10px;
-                padding: 10px;
-                margin-bottom: 10px;
-                box-shadow: 2px 2px 10px rgba(0,0,0,0.1);
-                ">
-                <h4 style="text-align: center;">{title}</h4>
-            """,
-            unsafe_allow_html=True
-        )
-        st.plotly_chart(fig, use_container_width=True)
-        st.markdown("</div>", unsafe_allow_html=True)
 
-    with st.container():
-        col1, col2 = st.columns(2)
+# Interrupteur d'affichage d'une section : une section fermée ne calcule rien
+def section_ouverte(titre, ouverte=False):
+    return st.toggle(titre, value=ouverte, key=f"section_{titre}")
+
 
-        # Graphique 1
-        fig1 = px.bar(df, x='PR Appr-RFQ Entry Dt', y='PO Buyer', title="")
-        with col1:
-            display_chart_with_border(fig1, "Jours entre l'approbation de PR et la saisie de RFQ")
+# Chaque section est un fragment mesuré : ses propres widgets ne relancent qu'elle-même,
+# et une relance du fragment seul est journalisée comme une relance à part
+def section(func):
+    @functools.wraps(func)
+    def mesuree(*args, **kwargs):
+        with profil().fragment(func.__name__):
+            return func(*args, **kwargs)
+    return st.fragment(mesuree)
 
-        # Graphique 2
-        fig2 = px.bar(df, x='PR Appr-RC EDt', y='PO Buyer', title="")
-        with col2:
-            display_chart_with_border(fig2, "Jours entre l'approbation de PR et la saisie de RD")
 
+@section
+def section_overview(df, masque, precalcul, agregats, donnees):
+    if not section_ouverte("OVERVIEW", ouverte=True):
+        return
+    # Indicateurs précalculés par le mode batch quand ils existent, sinon calculés ici
+    if precalcul:
+        overview, totaux = precalcul["overview"], precalcul["totaux"]
+    else:
+        # Comptes distincts sur les codes des identifiants, factorisés une fois au chargement
+        overview = donnees.distinct.counts(masque)
+        # Totaux lus dans le cube quand il couvre les filtres
+        if agregats is not None:
+            totaux = agregats.quantity_totals()
+        else:
+            totaux = quantity_totals(vue(df, masque, [col for _, col in QUANTITY_TOTALS]))
+
+    st.subheader("OVERVIEW")
     with st.container():
-        col1, col2 = st.columns(2)
+        for (label, _), col in zip(OVERVIEW_COUNTS, st.columns(len(OVERVIEW_COUNTS))):
+            display_metric(label, overview[label], col)
+
+    st.subheader("")
+    with st.container():
+        col1, col2, col3, col4 = st.columns(4)
+        display_metric("Quantités commandées", f"{int(totaux['Quantités commandées']):,}".replace(","," "), col1)
+        display_metric("Quantités recues", f"{int(totaux['Quantités recues']):,}".replace(","," "), col2)
+        display_metric("Balance", f"{int(totaux['Balance']):,}".replace(","," "), col3)
+        display_metric("Valeurs engagées", f"${int(totaux['Valeurs engagées']):,}".replace(",", " "), col4)
+
+
+@section
+def section_quantites(df, masque, agregats, requete):
+    if not section_ouverte("Quantités par mois", ouverte=True):
+        return
+    # Quantités agrégées par mois : un point par mois au lieu d'une barre par ligne,
+    # lues dans le cube, calculées par DuckDB, ou sommées sur les lignes retenues
+    mensuel = None
+    if agregats is not None:
+        mensuel = agregats.monthly_totals(['Quantity Ordered', 'Quantity Received'])
+    elif requete is not None:
+        try:
+            mensuel = mensuel_requete(*requete)
+        except query.QueryError:
+            pass
+    if mensuel is None:
+        mensuel = monthly_totals(vue(df, masque, ['Date', 'Quantity Ordered', 'Quantity Received']),
+                                 ['Quantity Ordered', 'Quantity Received'])
 
-        # Graphique 3
-        fig3 = px.bar(df, x='PR Appr-PO EDt', y='PO Buyer', title="")
-        with col1:
-            display_chart_with_border(fig3, "Jours entre l'approbation de PR et la création de PO")
-
-        # Graphique 4
-        fig4 = px.bar(df, x='PO Appr-RC EDt', y='PO Buyer', title="")
-        with col2:
-            display_chart_with_border(fig4, "Jours entre l'approbation de PO et RD EDt")
-
-    ###UPDATE######
-    # Fonction pour afficher un graphique encadré avec un titre centré
-    def display_chart_with_border(fig, title):
-        st.markdown(
-            f"""
-            <div style="
-                border: 2px solid #4CAF50;
-                border-radius: 10px;
-                padding: 15px;
-                margin-bottom: 15px;
-                box-shadow: 2px 2px 8px rgba(0,0,0,0.1);
-                background-color:rgb(34, 242, 117);
-            ">
-                <h4 style="text-align: center;">{title}</h4>
-            """,
-            unsafe_allow_html=True
-        )
-        st.plotly_chart(fig, use_container_width=True)
-        st.markdown("</div>", unsafe_allow_html=True)
-
-    st.subheader("PROCUREMENT PERFORMANCES")
     with st.container():
         col1, col2 = st.columns(2)
 
-        fig1 = px.bar(df, x='PR Appr-RFQ Entry Dt', y='PO Buyer')
-        with col1:
-            display_chart_with_border(fig1, "Jours entre l'approbation de PR et la saisie de RFQ")
+        fig1, fig2 = quantity_figures(mensuel)
+        afficher_graphique(fig1, col1, use_container_width=True)
+        afficher_graphique(fig2, col2, use_container_width=True)
 
-        fig2 = px.bar(df, x='PR Appr-RC EDt', y='PO Buyer')
-        with col2:
-            display_chart_with_border(fig2, "Jours entre l'approbation de PR et la saisie de RD")
+@section
+def section_seuils(df, masque, precalcul, agregats):
+    if not section_ouverte("Seuil d'approbation des PO"):
+        return
+    st.title("Seuil d'approbation des PO")
 
-    with st.container():
-        col1, col2 = st.columns(2)
+    # Occurrences précalculées, lues dans le cube, ou comptées sur les lignes retenues
+    def occurrences(colonne):
+        if precalcul:
+            return pd.Series(precalcul['seuils'][colonne], name='count').rename_axis(colonne)
+        if agregats is not None:
+            return agregats.threshold_counts(colonne)
+        return threshold_counts(vue(df, masque, [colonne]), colonne)
 
-        fig3 = px.bar(df, x='PR Appr-PO EDt', y='PO Buyer')
-        with col1:
-            display_chart_with_border(fig3, "Jours entre l'approbation de PR et la création de PO")
+    fig_threshold_1 = threshold_figure(occurrences('Threshold 1'), 'Threshold 1')
+    fig_threshold_2 = threshold_figure(occurrences('Threshold 2'), 'Threshold 2')
+    fig_threshold_3 = threshold_figure(occurrences('Threshold 3'), 'Threshold 3')
 
-        fig4 = px.bar(df, x='PO Appr-RC EDt', y='PO Buyer')
-        with col2:
-            display_chart_with_border(fig4, "Jours entre l'approbation de PO et RD EDt")
+    # Organiser les graphiques en 3 colonnes
+    col1, col2, col3 = st.columns(3)
 
-    st.subheader("FINANCES PERFORMANCES")
-    with st.container():
-        col1, col2 = st.columns(2)
+    with col1:
+        afficher_graphique(fig_threshold_1)
 
-        fig5 = px.bar(df, x='RC-VCH EDt', y='Vch Data Entered By')
-        with col1:
-            display_chart_with_border(fig5, "Jours entre réception de Voucher et Vch Data Entrered")
+    with col2:
+        afficher_graphique(fig_threshold_2)
 
-        fig6 = px.bar(df, x='VCH Appr-PY EDt', y='Vch Data Entered By')
-        with col2:
-            display_chart_with_border(fig6, "Jours entre VCH Appr-PY EDt")
+    with col3:
+        afficher_graphique(fig_threshold_3)
 
-    st.subheader("APPROBATION ET RECEPTION PERFORMANCES")
-    with st.container():
-        col1, col2 = st.columns(2)
 
-        fig7 = px.bar(df, x='PO TotApprv T', y='PO Last Approver')
-        with col1:
-            display_chart_with_border(fig7, "Jours entre l'approbation des PO")
+@section
+def section_durees(df, masque, digest, etat_filtres, precalcul, agregats):
+    if not section_ouverte("Visualisation des Durées des Phases d'approbation"):
+        return
+    st.title("Visualisation des Durées des Phases d'approbation")
 
-        fig8 = px.bar(df, x='PR-RC EDt', y='Rcpt Data Entered By')
-        with col2:
-            display_chart_with_border(fig8, "Jours entre la réception des articles")
+    columns = DURATION_COLUMNS
+    # Les centiles ne s'additionnent pas : ils ne viennent pas du cube et obligent à relire les lignes
+    centiles = st.toggle("Centiles P50 / P90 / P95", key="centiles_durees")
 
-    #######FINUPDATE######
-  
-    #################################################
+    # Toutes les statistiques des 15 durées en un seul passage, mémorisées par état des filtres
+    if precalcul:
+        stats = durations_frame(precalcul)
+    elif agregats is not None and not centiles:
+        stats = agregats.duration_stats(columns)
+    else:
+        stats = stats_durees(digest, etat_filtres, tuple(columns), df, masque)
 
-        # Calcul de la balance (quantité restante)
-    df["Balance"] = df["Quantity Ordered"] - df["Quantity Received"]
+    # Affichage des statistiques pour chaque colonne
+    for i in range(0, len(columns), 5):  # Diviser les colonnes en groupes de 5
+        cols = columns[i:i + 5]  # Prendre un sous-ensemble de colonnes
+        col1, col2, col3, col4, col5 = st.columns(5)  # Créer 5 colonnes dans Streamlit
 
+        # Affichage des statistiques pour chaque colonne dans chaque colonne de Streamlit
+        for j, col in enumerate(cols):
+            with [col1, col2, col3, col4, col5][j]:
+                st.subheader(col)
+                st.write(f"Moyenne : {stats.at[col, 'Moyenne']:.0f} jours")
+                st.write(f"Maximale : {stats.at[col, 'Max']:.0f} jours")
+                st.write(f"Écart-type : {stats.at[col, 'Écart-type']:.0f} jours")
+                st.write(f"Total : {stats.at[col, 'Somme']:.0f} jours")
+                if pd.notna(stats.at[col, 'P50']):
+                    st.write(f"P50 / P90 / P95 : {stats.at[col, 'P50']:.0f} / {stats.at[col, 'P90']:.0f} / {stats.at[col, 'P95']:.0f} jours")
+                st.write("---")
+    ####
+    # Créer un graphique global pour toutes les colonnes
+    st.header("Moyenne des Durées de jours")
+
+    fig_avg = duration_means_figure(stats)
+    afficher_graphique(fig_avg, titre="Moyenne des Durées de jours")
+
+    # Créer un graphique à barres empilées des totaux
+    st.header("Total des Durées de jours")
+    fig_total = duration_totals_figure(stats)
+    afficher_graphique(fig_total, titre="Total des Durées de jours")
+
+@section
+def section_age(df, masque, digest, etat_filtres, precalcul, agregats):
+    if not section_ouverte("MOYENNE D'AGE", ouverte=True):
+        return
+    # PR STATUS - Nombre de jours
+    st.subheader("MOYENNE D'AGE")
+    if precalcul:
+        ages = precalcul["ages"]
+    elif agregats is not None:
+        ages = agregats.duration_stats(AGING_COLUMNS)['Moyenne']
+    else:
+        ages = stats_durees(digest, etat_filtres, tuple(AGING_COLUMNS), df, masque)['Moyenne']
+    with st.container():
+        col1, col2, col3, col4 = st.columns(4)
+        display_metric("Moyenne Age PR", f"{int(ages['PR Aging']):,} Jour.s".replace(",", " "), col1)
+        display_metric("Moyenne Age PO", f"{int(ages['PO Aging']):,} Jour.s".replace(",", " "), col2)
+        display_metric("Moyenne Age RC", f"{int(ages['RC Aging']):,} Jour.s".replace(",", " "), col3)
+        display_metric("Moyenne Age VCH", f"{int(ages['VCH Aging']):,} Jour.s".replace(",", " "), col4)
+
+
+@section
+def section_performances(df, masque, requete, complet):
+    if not section_ouverte("PERFORMANCES"):
+        return
+
+    # Résumés calculés par DuckDB quand c'est possible ; sinon, seules les deux colonnes de chaque
+    # graphique sont extraites des lignes retenues
+    def performance_figure_vue(valeur, personne):
+        if requete is not None:
+            try:
+                return summary_figure(performances_requete(*requete[:3], valeur, personne, requete[3]), valeur, personne)
+            except query.QueryError:
+                pass
+        # Historique chargé sur quelques colonnes : le repli relit l'historique complet
+        lignes = df if complet is None else complet()
+        return performance_figure(vue(lignes, masque, [valeur, personne]), valeur, personne)
+
+    for i, (rubrique, graphiques) in enumerate(PERFORMANCE_CHARTS):
+        (st.header if i == 0 else st.subheader)(rubrique)
+        # Deux graphiques par ligne
+        for k in range(0, len(graphiques), 2):
+            with st.container():
+                for (valeur, personne, titre), col in zip(graphiques[k:k + 2], st.columns(2)):
+                    fig = performance_figure_vue(valeur, personne)
+                    with col:
+                        display_chart_with_border(fig, titre)
+
+@section
+def section_suivi(df, requisitions, masque):
     # Affichage du titre
     st.title("Suivi des Commandes")
 
     #################
-    # Sélection de l'ID de la commande
-    selected_requisition_id = st.selectbox("Sélectionnez un ID de commande ou le numero de la requisition :", [None] + list(df["Requisition ID"].unique()))
+    # Sélection de l'ID de la commande : seul ce fragment est relancé, pas les KPIs ni les graphiques
+    # Seules les premières correspondances de la recherche sont envoyées au navigateur
+    recherche = st.text_input("Rechercher une requisition (début de l'ID) :", key="recherche_suivi")
+    selected_requisition_id = st.selectbox("Sélectionnez un ID de commande ou le numero de la requisition :", [None] + requisitions.search(recherche, mask=masque))
 
     # Vérification si un ID a été sélectionné
     if selected_requisition_id is not None:
-        # Filtrage des données en fonction de l'ID sélectionné
-        filtered_df = df[df["Requisition ID"] == selected_requisition_id]
+        # Lignes de la commande lues dans l'index, limitées à celles retenues par les filtres
+        lignes = requisitions.rows(selected_requisition_id)
+        filtered_df = df.iloc[lignes if masque is None else lignes[masque[lignes]]]
 
         # Affichage des résultats
         st.subheader(f"Détails des articles pour la commande : {selected_requisition_id}")
-        st.dataframe(filtered_df[["PR Item", "Quantity Ordered", "Quantity Received", "Balance"]])
+        detail = filtered_df[COLONNES_SUIVI[:4]]
+        st.dataframe(detail)
+        st.download_button("Télécharger le détail (CSV)", detail.to_csv(index=False).encode("utf-8-sig"),
+                           file_name=f"requisition_{selected_requisition_id}.csv", mime="text/csv", key="export_detail")
 
         # Récupération des informations RFQ, PO No, et PO Aging (valeurs uniques pour la commande sélectionnée)
         rfq_id = filtered_df["RFQ ID"].iloc[0] if not filtered_df.empty else "N/A"
@@ -468,3 +396,262 @@ if uploaded_file:
     else:
         st.warning("Veuillez sélectionner un ID de commande.")
 
+
+@section
+def section_export(df, masque, digest, cle_filtres, complet):
+    if not section_ouverte("Export des lignes filtrées"):
+        return
+    st.subheader("Export des lignes filtrées")
+    lignes = len(df) if masque is None else int(masque.sum())
+    format_export = st.radio("Format", list(EXPORT_FORMATS), format_func=str.upper, horizontal=True, key="format_export")
+
+    # Écriture par blocs dans un fichier : ni seconde copie des lignes, ni classeur complet en mémoire
+    if not st.button(f"Préparer l'export ({lignes} lignes)", key="preparer_export"):
+        return
+    # Le dernier export de la session est réutilisé tant que l'extrait, les filtres et le format ne changent pas
+    export = st.session_state.get("export")
+    if not (export and export[:3] == (digest, cle_filtres, format_export) and os.path.exists(export[3])):
+        try:
+            with st.spinner("Export en cours..."), profil().stage("export", rows_in=lignes):
+                # Toutes les colonnes sont exportées : un historique chargé partiellement est relu en entier
+                chemin, mesures = export_filtered(df if complet is None else complet(), masque, format_export,
+                                                  digest, cle_filtres)
+        except (OSError, ValueError) as exc:
+            st.error(f"Export impossible : {exc}")
+            return
+        export = (digest, cle_filtres, format_export, str(chemin), mesures)
+        st.session_state["export"] = export
+    mesures = export[4]
+    st.caption(f"{mesures['lignes']} lignes exportées en {mesures['secondes']:.2f} s "
+               f"({mesures['octets'] / 2 ** 20:.1f} Mo)")
+    if mesures['octets'] > EXPORT_DOWNLOAD_MAX_MB * 2 ** 20:
+        st.warning(f"Fichier trop volumineux pour le téléchargement (plus de {EXPORT_DOWNLOAD_MAX_MB:g} Mo) : "
+                   f"choisissez le format Parquet ou restreignez les filtres. Fichier sur le serveur : {export[3]}")
+        return
+    # Streamlit lit le fichier entier en mémoire pour le bouton : il n'est créé que dans la relance du clic,
+    # et la copie est libérée dès les relances suivantes
+    with open(export[3], "rb") as fichier:
+        st.download_button("Télécharger l'export", fichier, file_name=f"export_{cle_filtres}.{format_export}",
+                           mime=EXPORT_FORMATS[format_export], key="telecharger_export")
+
+
+# Configuration de la page
+st.set_page_config(page_title="CARE DRC PROCUREMENT STATUS DASHBOARD", layout="wide")
+
+# Chargement du logo
+logo_path = "images.png"
+if os.path.exists(logo_path):
+    st.image(logo_path, width=150)
+
+# En-tête
+st.title("CARE DRC PROCUREMENT STATUS DASHBOARD")
+st.markdown("**Auteur : CARE DRC | Conception : Michel Kamwanga | Contribution technique : Bennet Shabani**")
+
+# Panneau de performance : le pic de mémoire par étape n'est relevé que lorsqu'il est ouvert
+perf = profil()
+debug = st.sidebar.toggle("Panneau de performance", key="panneau_perf")
+perf.memory = debug
+perf.start_run()
+
+# Chargement des données
+uploaded_files = st.file_uploader("Chargez un ou plusieurs fichiers Excel extraits de Peoplesoft. Ne changez pas les noms de colonnes ", type=["xls", "csv","xlsx"], accept_multiple_files=True)
+df = None
+# Lecture des colonnes manquantes d'un historique chargé partiellement, sinon None
+complet = None
+if uploaded_files:
+    # L'extrait n'est analysé qu'une fois par contenu (Dept ID déjà traduit), puis relu depuis son instantané Parquet
+    # Plusieurs fichiers (ou feuilles) sont lus en parallèle et réunis en un seul extrait
+    fichiers = [(f.getvalue(), f.name) for f in uploaded_files]
+    digest = files_hash(fichiers)
+    try:
+        with perf.stage("chargement") as etape:
+            donnees = charger_extrait(digest, fichiers)
+            df = donnees.df
+            etape["lignes_sortie"] = len(df)
+    except ValueError as exc:
+        st.error(f"Extrait invalide : {exc}")
+        # La relance s'arrête ici : elle est close pour rendre le traçage et ne plus compter comme en cours
+        perf.finish_run()
+        st.stop()
+
+    # Ajout à l'historique local : seules les lignes nouvelles ou modifiées sont écrites
+    if st.sidebar.button("Ajouter cet extrait à l'historique"):
+        try:
+            resultat = store.ingest(df)
+        except (OSError, ValueError) as exc:
+            st.sidebar.error(f"Écriture dans l'historique impossible : {exc}")
+        else:
+            st.sidebar.success(f"{resultat['nouvelles']} nouvelles lignes, {resultat['modifiees']} modifiées, "
+                               f"{resultat['inchangees']} inchangées.")
+elif version_historique := store.version():
+    # Sans fichier chargé : lecture de l'historique, limitée aux années et bureaux choisis
+    with st.sidebar:
+        st.header("Historique")
+        partitions = store.partitions()
+        annees = sorted({annee for annee, _ in partitions})
+        bureaux = sorted({bureau for _, bureau in partitions})
+        annees_choisies = st.multiselect("Années de l'historique", annees, default=annees[-1:])
+        bureaux_choisis = st.multiselect("Bureaux de l'historique", bureaux, default=[])
+    digest = content_hash(json.dumps([version_historique, annees_choisies, bureaux_choisis]).encode('utf-8'))
+    # Avec DuckDB, les indicateurs et les graphiques sont lus dans les partitions : seules les colonnes des
+    # filtres et du suivi sont chargées, le reste n'est relu qu'à la demande
+    if query.available() and query.store_source(annees_choisies or None, bureaux_choisis or None) is not None:
+        complet = functools.partial(historique_complet, digest, tuple(annees_choisies), tuple(bureaux_choisis))
+    try:
+        with perf.stage("chargement") as etape:
+            donnees = charger_historique(digest, tuple(annees_choisies), tuple(bureaux_choisis), complet is not None)
+            if donnees is not None:
+                df = donnees.df
+            etape["lignes_sortie"] = 0 if df is None else len(df)
+    except (OSError, ValueError) as exc:
+        # Partition illisible ou retirée pendant la lecture
+        st.error(f"Lecture de l'historique impossible : {exc}")
+        perf.finish_run()
+        st.stop()
+    if donnees is None:
+        st.info("Aucune donnée dans l'historique pour ces années et bureaux.")
+
+if df is not None:
+    # Index des filtres, construit une fois par extrait et partagé entre les relances et les sessions
+    with perf.stage("index des filtres", rows_in=len(df)):
+        index = donnees.index
+        ids = donnees.ids
+
+    # Sidebar pour les filtres
+    with st.sidebar:
+        st.header("Filtres")
+        if st.session_state.get("filtres_extrait") != digest:
+            # Nouvel extrait : les sélections précédentes ne s'appliquent plus
+            for label, _, _ in SIDEBAR_FILTERS:
+                st.session_state.pop(f"filtre_{label}", None)
+            st.session_state["filtres_extrait"] = digest
+
+        # Sélections courantes lues avant de créer les widgets, pour proposer des options en cascade
+        selections = [
+            (col, st.session_state.get(f"filtre_{label}", defaut))
+            for (label, _, _), (col, defaut) in zip(SIDEBAR_FILTERS, default_selections(index))
+        ]
+
+        # « Tous les filtres sauf celui-ci » pour chaque filtre, chaque sélection n'étant combinée qu'une fois
+        sans = index.without(selections)
+        for i, (label, col, _) in enumerate(SIDEBAR_FILTERS):
+            choix = selections[i][1]
+            if col in ID_SEARCH_COLUMNS:
+                # Identifiants trop nombreux pour être tous listés : recherche par début d'identifiant
+                recherche = st.text_input(f"Rechercher {label}", key=f"recherche_{label}", placeholder="Début de l'identifiant")
+                options = ids[col].search(recherche, mask=index.unpack(sans[i]))
+            else:
+                options = index.options(i, selections, sans)
+            # Les valeurs déjà choisies restent proposées même si les autres filtres les excluent
+            proposees = set(options)
+            options = options + [v for v in choix if v not in proposees]
+            st.multiselect(label, options, default=choix, key=f"filtre_{label}")
+
+    # Appliquer les filtres : un seul masque combiné ; l'extrait partagé n'est jamais copié en entier,
+    # chaque section n'extrait que ses colonnes des lignes retenues
+    with perf.stage("filtrage", rows_in=len(df)) as etape:
+        masque = index.mask(selections)
+        # Hors OVERVIEW, seules les lignes dont la 'Date' (1er du mois de 'PR-Year'/'PR-Month') est connue comptent
+        masque_datees = combine_masks(masque, donnees.dated)
+        etape["lignes_sortie"] = len(df) if masque is None else int(masque.sum())
+    # Cube des indicateurs : il répond seul tant que les filtres ne portent que sur ses dimensions,
+    # les lignes ne sont alors relues que pour les vues de détail
+    with perf.stage("cube") as etape:
+        # Sur un historique chargé partiellement, le cube n'a pas ses colonnes : DuckDB répond à sa place
+        cube = None if complet is not None else donnees.cube
+        agregats = cube.rollup(selections) if cube is not None and cube.covers(selections) else None
+        etape["lignes_sortie"] = None if agregats is None else len(agregats.cells)
+    etat_filtres = filter_state(selections)
+    # Le journal garde l'empreinte de l'extrait et les filtres qui s'écartent de la sélection par défaut
+    perf.tag(extract=digest, filters={
+        "cle": filter_key(selections),
+        "actifs": {label: list(choix) for (label, _, _), (_, choix), (_, defaut)
+                   in zip(SIDEBAR_FILTERS, selections, default_selections(index)) if list(choix) != list(defaut)},
+    })
+    precalcul = kpis_precalcules(digest, filter_key(selections))
+    # Sans indicateurs précalculés ni cube couvrant les filtres : requêtes DuckDB sur les fichiers Parquet
+    # (instantané de l'extrait ou partitions de l'historique), le calcul pandas restant le repli
+    requete = None
+    if query.available():
+        source = query.extract_source(digest) if uploaded_files else query.store_source(
+            annees_choisies or None, bureaux_choisis or None)
+        if source is not None:
+            requete = (digest, filter_key(selections), source, selections)
+    if precalcul is None and agregats is None and requete is not None:
+        with perf.stage("requete") as etape:
+            try:
+                precalcul = kpis_requete(*requete[:3], st.session_state.get("centiles_durees", False), requete[3])
+                etape["lignes_sortie"] = precalcul["lignes"]
+            except query.QueryError:
+                requete = None
+    if complet is not None and requete is None and precalcul is None:
+        # Requête impossible : repli pandas sur l'historique complet
+        try:
+            with perf.stage("chargement complet") as etape:
+                df = complet()
+                donnees = cache_partage().get(digest, lambda: SharedDataset(df))
+                etape["lignes_sortie"] = len(df)
+        except (OSError, ValueError) as exc:
+            st.error(f"Lecture de l'historique impossible : {exc}")
+            perf.finish_run()
+            st.stop()
+        complet = None
+
+    # Style CSS personnalisé
+    st.markdown("""
+        <style>
+            .metric-container {
+                background-color: orange;
+                border: 2px solid green;
+                border-radius: 10px;
+                padding: 15px;
+                text-align: center;
+                font-weight: bold;
+                color: white;
+                font-size: 15px;
+            }
+            .metric-value {
+                font-size: 30px;
+                font-weight: bold;
+            }
+        </style>
+    """, unsafe_allow_html=True)
+
+    section_overview(df, masque, precalcul, agregats, donnees)
+    section_quantites(df, masque_datees, agregats, requete)
+    section_seuils(df, masque_datees, precalcul, agregats)
+    section_durees(df, masque_datees, digest, etat_filtres, precalcul, agregats)
+    section_age(df, masque_datees, digest, etat_filtres, precalcul, agregats)
+
+    st.markdown("<br>", unsafe_allow_html=True)  # Un saut de ligne
+    st.divider()
+    section_performances(df, masque_datees, requete, complet)
+    section_suivi(df, ids['Requisition ID'], masque_datees)
+    section_export(df, masque, digest, filter_key(selections), complet)
+
+mesures = perf.finish_run()
+
+if df is not None:
+    # Rapport des données envoyées au navigateur par les graphiques
+    tailles = pd.DataFrame([{"Graphique": f["graphique"], "Points": f["points"], "Ko": round(f["octets"] / 1024, 1)}
+                            for f in mesures["figures"]], columns=["Graphique", "Points", "Ko"])
+    with st.sidebar.expander("Taille des graphiques"):
+        st.caption(f"{mesures['octets_figures'] / 1024:.0f} Ko au total, limite de {MAX_FIGURE_BYTES // 1024} Ko par graphique")
+        st.dataframe(tailles, hide_index=True)
+
+if debug:
+    # Durée, pic de mémoire et lignes de chaque étape de cette relance
+    with st.sidebar.expander("Performance de la relance", expanded=True):
+        st.caption(f"{mesures['secondes']:.2f} s au total, {mesures['octets_figures'] / 1024:.0f} Ko de graphiques")
+        if mesures["memoire"]:
+            st.caption("Pic de mémoire du processus entier : il compte aussi les allocations des autres sessions "
+                       "pour les étapes marquées « autres relances ».")
+        else:
+            st.caption("Pic de mémoire indisponible : une autre session mesure déjà la mémoire.")
+        st.dataframe(pd.DataFrame(mesures["etapes"]).rename(columns={
+            "pic_mo": "pic processus (Mo)", "autres_relances": "autres relances"}), hide_index=True)
+        cache = cache_partage().stats()
+        st.caption(f"Cache partagé : {cache['succes']} succès, {cache['defauts']} défauts, {cache['evictions']} évictions, "
+                   f"{cache['entrees']} extrait(s), {cache['mo']:.0f} / {cache['plafond_mo']:.0f} Mo")
+        if perf.log_path:
+            st.caption(f"Journal : {perf.log_path}")
@@ -0,0 +1 @@
+"""Couche de données du tableau de bord CARE DRC PROCUREMENT STATUS DASHBOARD."""
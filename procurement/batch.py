@@ -0,0 +1,87 @@
+"""Mode batch : calcule les indicateurs du tableau de bord sans Streamlit.
+
+Les filtres sont construits comme dans la barre latérale (toutes les valeurs par
+défaut), puis restreints aux bureaux, codes de fonds et années demandés. Les
+résultats sont écrits là où l'interface les cherche, sous l'empreinte de
+l'extrait et la clé des filtres.
+
+Tâche de nuit, un fichier par bureau de ``DEPT_MAPPING`` plus la vue complète :
+
+    python -m procurement.batch extrait.xlsx --all-offices
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from procurement.filters import FilterIndex, default_selections, filter_key
+from procurement.ingest import DEPT_MAPPING, load_extract
+from procurement.metrics import PRECOMPUTED_DIR, compute_kpis, save_kpis
+
+
+def _matches(value, wanted):
+    """Compare une valeur de l'extrait à une valeur saisie en ligne de commande (2023 == '2023')."""
+    if str(value) == wanted:
+        return True
+    try:
+        return float(value) == float(wanted)
+    except (TypeError, ValueError):
+        return False
+
+
+def selections_for(index, offices=(), fund_codes=(), years=()):
+    """Sélections de la barre latérale restreintes aux bureaux, fonds et années donnés."""
+    overrides = {'Dept ID': offices, 'Fund Code': fund_codes, 'PR-Year': years}
+    selections = default_selections(index)
+    for i, (column, values) in enumerate(selections):
+        wanted = [str(w) for w in overrides.get(column) or ()]
+        if wanted:
+            selections[i] = (column, [v for v in index.all_options(column) if any(_matches(v, w) for w in wanted)])
+            overrides[column] = None
+    return selections
+
+
+def run(path, offices=(), fund_codes=(), years=(), all_offices=False, output=None, fmt="json"):
+    """Calcule et enregistre les indicateurs ; retourne la liste des fichiers écrits."""
+    path = Path(path)
+    digest, df = load_extract(path.read_bytes(), path.name)
+    index = FilterIndex(df)
+    jobs = [list(offices)]
+    if all_offices:
+        present = set(index.all_options('Dept ID'))
+        jobs += [[office] for office in DEPT_MAPPING.values() if office in present]
+    written = []
+    for job_offices in jobs:
+        selections = selections_for(index, job_offices, fund_codes, years)
+        kpis = compute_kpis(index.apply(df, selections))
+        written.append(save_kpis(kpis, digest, filter_key(selections), output, fmt))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m procurement.batch",
+        description="Calcule les indicateurs du tableau de bord à partir d'un extrait PeopleSoft.",
+    )
+    parser.add_argument("extract", help="extrait PeopleSoft (xlsx, xls ou csv)")
+    parser.add_argument("--office", action="append", default=[], help="bureau (ex. Goma), répétable")
+    parser.add_argument("--fund-code", action="append", default=[], help="code de fonds, répétable")
+    parser.add_argument("--year", action="append", default=[], help="année PR, répétable")
+    parser.add_argument("--all-offices", action="store_true",
+                        help="calcule aussi un fichier par bureau de DEPT_MAPPING")
+    parser.add_argument("--output", default=None, help=f"répertoire de sortie (défaut : {PRECOMPUTED_DIR})")
+    parser.add_argument("--format", choices=["json", "parquet"], default="json")
+    args = parser.parse_args(argv)
+
+    try:
+        written = run(args.extract, args.office, args.fund_code, args.year,
+                      args.all_offices, args.output, args.format)
+    except (OSError, ValueError) as exc:
+        print(f"Erreur : {exc}", file=sys.stderr)
+        return 1
+    for path in written:
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
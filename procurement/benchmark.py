@@ -0,0 +1,217 @@
+"""Mesures de performance du tableau de bord sur des extraits synthétiques.
+
+Chaque étape du traitement est chronométrée séparément, avec son pic de mémoire
+(``tracemalloc``) et ses nombres de lignes en entrée et en sortie : lecture,
+traduction des bureaux, typage, dérivation des dates, puis les mêmes chemins
+que le tableau de bord : index des filtres, comptes distincts et cube d'un
+extrait partagé (``SharedDataset``), masque des filtres, indicateurs de
+l'OVERVIEW sous ce masque, agrégats du cube, statistiques des durées,
+construction des figures et export des lignes filtrées (Parquet puis CSV).
+
+    python -m procurement.benchmark --rows 10000 100000 1000000 --json mesures.json
+    python -m procurement.benchmark --rows 100000 --compare mesures.json
+
+Avec ``--compare``, toute étape plus lente que la référence au-delà de la
+tolérance est signalée et le code de sortie vaut 1.
+"""
+import argparse
+import gc
+import json
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+from procurement.charts import (
+    PERFORMANCE_CHARTS, figure_payload_bytes, monthly_totals, performance_figure, quantity_figures,
+)
+from procurement.cube import Cube
+from procurement.export import export_rows
+from procurement.filters import default_selections
+from procurement.ingest import map_departments, read_extract
+from procurement.metrics import QUANTITY_TOTALS, THRESHOLD_COLUMNS, quantity_totals
+from procurement.perf import measure_stage
+from procurement.schema import AGING_COLUMNS, DURATION_COLUMNS, convert_types, derive_columns, validate_columns
+from procurement.shared import SharedDataset, combine_masks
+from procurement.stats import duration_stats
+from procurement.synthetic import generate_extract, write_extract
+
+# Écart de temps en dessous duquel une différence est considérée comme du bruit (secondes)
+NOISE_FLOOR = 0.05
+
+
+def _rows(value):
+    return len(value) if hasattr(value, '__len__') and not isinstance(value, (dict, str)) else None
+
+
+def measure(stage, func, *args, rows_in=None):
+    """Exécute ``func(*args)`` et retourne ``(résultat, mesure)`` pour l'étape donnée."""
+    gc.collect()
+    with measure_stage(stage, rows_in) as record:
+        result = func(*args)
+    record["lignes_sortie"] = _rows(result)
+    return result, record
+
+
+def _translate(df):
+    validate_columns(df)
+    return map_departments(df)
+
+
+def _view(df, mask, columns):
+    # Comme le tableau de bord : seules les colonnes utiles des lignes retenues sont copiées
+    return df[columns] if mask is None else df.loc[mask, columns]
+
+
+def _count(mask, n):
+    return n if mask is None else int(mask.sum())
+
+
+def _overview(dataset, mask):
+    totals = quantity_totals(_view(dataset.df, mask, [col for _, col in QUANTITY_TOTALS]))
+    return {**dataset.distinct.counts(mask), **totals}
+
+
+def _rollup(cube, selections):
+    """Agrégats lus dans le cube par les sections quand il couvre les filtres."""
+    rollup = cube.rollup(selections)
+    rollup.quantity_totals()
+    rollup.monthly_totals(['Quantity Ordered', 'Quantity Received'])
+    for col in THRESHOLD_COLUMNS:
+        rollup.threshold_counts(col)
+    rollup.duration_stats(DURATION_COLUMNS + AGING_COLUMNS)
+    return rollup.cells
+
+
+def _durations(df, mask):
+    columns = DURATION_COLUMNS + AGING_COLUMNS
+    return duration_stats(_view(df, mask, columns), columns)
+
+
+def _figures(df, mask=None):
+    # Les mêmes graphiques que le tableau de bord : quantités par mois et performances par personne
+    quantities = ['Quantity Ordered', 'Quantity Received']
+    figures = list(quantity_figures(monthly_totals(_view(df, mask, ['Date'] + quantities), quantities)))
+    figures += [performance_figure(_view(df, mask, [value, person]), value, person)
+                for _, charts in PERFORMANCE_CHARTS for value, person, _ in charts]
+    return {"figures": len(figures), "octets": sum(figure_payload_bytes(fig) for fig in figures)}
+
+
+def _typical_selections(index):
+    """Sélection typique : deux bureaux et la dernière année, le reste par défaut."""
+    selections = default_selections(index)
+    for i, (column, values) in enumerate(selections):
+        if column == 'Dept ID':
+            selections[i] = (column, values[:2])
+        elif column == 'PR-Year':
+            selections[i] = (column, values[-1:])
+    return selections
+
+
+def run_pipeline(path):
+    """Mesure chaque étape du tableau de bord sur un fichier d'extrait ; retourne la liste des mesures."""
+    path = Path(path)
+    data = path.read_bytes()
+    records = []
+
+    def step(stage, func, *args, rows_in=None):
+        result, record = measure(stage, func, *args, rows_in=rows_in)
+        records.append(record)
+        return result
+
+    df = step("chargement", read_extract, data, path.name)
+    n = len(df)
+    df = step("traduction des bureaux", _translate, df, rows_in=n)
+    df = step("typage", convert_types, df, rows_in=n)
+    df = step("dérivation des dates", derive_columns, df, rows_in=n)
+    # Index, comptes distincts et cube construits comme pour l'extrait partagé entre les sessions
+    dataset = SharedDataset(df)
+    index = step("index des filtres", lambda: dataset.index, rows_in=n)
+    step("comptes distincts", lambda: dataset.distinct, rows_in=n)
+    # Le tableau de bord renonce au cube au-delà de CUBE_MAX_RATIO cellule par ligne, ce qui est le cas
+    # des extraits synthétiques : il est construit ici quel que soit ce rapport, pour en suivre le coût
+    cube = step("cube", Cube.build, df, float("inf"), rows_in=n)
+    records[-1]["lignes_sortie"] = len(cube.cells)
+    # Le tableau de bord ne copie pas les lignes retenues : un masque, puis les colonnes utiles par section
+    selections = _typical_selections(index)
+    mask = step("filtrage", index.mask, selections, rows_in=n)
+    m = records[-1]["lignes_sortie"] = _count(mask, n)
+    dated = combine_masks(mask, dataset.dated)
+    step("OVERVIEW", _overview, dataset, mask, rows_in=m)
+    if cube.covers(selections):
+        step("agrégats du cube", _rollup, cube, selections, rows_in=len(cube.cells))
+    step("statistiques des durées", _durations, df, dated, rows_in=_count(dated, n))
+    figures = step("figures", _figures, df, dated, rows_in=_count(dated, n))
+    records[-1]["octets_figures"] = figures["octets"]
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ("parquet", "csv"):
+            exported = step(f"export {fmt}", export_rows, df, mask, fmt, Path(tmp) / f"export.{fmt}", rows_in=m)
+            records[-1]["lignes_sortie"] = exported["lignes"]
+    return records
+
+
+def run(sizes, fmt="csv", track_memory=True, seed=0):
+    """Génère un extrait par taille, mesure le pipeline et retourne un DataFrame des mesures."""
+    results = []
+    # Premier appel à Plotly (chargement des gabarits) hors mesure
+    _figures(derive_columns(convert_types(map_departments(generate_extract(1000, seed)))))
+    if track_memory:
+        tracemalloc.start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in sizes:
+                path = write_extract(generate_extract(size, seed), Path(tmp) / f"extrait_{size}.{fmt}")
+                file_mb = round(path.stat().st_size / 2 ** 20, 1)
+                for record in run_pipeline(path):
+                    results.append({"lignes": size, "format": fmt, "fichier_mo": file_mb, **record})
+                path.unlink()
+    finally:
+        if track_memory:
+            tracemalloc.stop()
+    return pd.DataFrame(results)
+
+
+def regressions(current, baseline, tolerance):
+    """Étapes plus lentes que la référence au-delà de ``tolerance`` (fraction) et du bruit."""
+    merged = current.merge(baseline, on=["lignes", "format", "etape"], suffixes=("", "_reference"))
+    slower = (merged["secondes"] > merged["secondes_reference"] * (1 + tolerance)) & (
+        merged["secondes"] - merged["secondes_reference"] > NOISE_FLOOR)
+    return merged.loc[slower, ["lignes", "etape", "secondes_reference", "secondes"]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m procurement.benchmark",
+                                     description="Mesure chaque étape du tableau de bord sur des extraits synthétiques.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000],
+                        help="tailles d'extraits à mesurer (10 000 à 5 000 000)")
+    parser.add_argument("--format", choices=["csv", "xlsx", "parquet"], default="csv")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="ne pas suivre la mémoire (plus rapide)")
+    parser.add_argument("--json", help="enregistre les mesures dans ce fichier")
+    parser.add_argument("--compare", help="mesures de référence (JSON) à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="ralentissement toléré (0.25 = +25 %%)")
+    args = parser.parse_args(argv)
+
+    try:
+        results = run(args.rows, args.format, not args.no_memory, args.seed)
+    except (OSError, ValueError) as exc:
+        print(f"Erreur : {exc}", file=sys.stderr)
+        return 1
+    print(results.to_string(index=False))
+    if args.json:
+        Path(args.json).write_text(json.dumps(results.to_dict(orient="records"), ensure_ascii=False, indent=1),
+                                   encoding="utf-8")
+    if args.compare:
+        baseline = pd.DataFrame(json.loads(Path(args.compare).read_text(encoding="utf-8")))
+        slower = regressions(results, baseline, args.tolerance)
+        if len(slower):
+            print("\nRégressions :\n" + slower.to_string(index=False))
+            return 1
+        print("\nAucune régression.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
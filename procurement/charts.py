@@ -0,0 +1,174 @@
+"""Agrégations côté serveur pour les graphiques du tableau de bord.
+
+Plotly ne reçoit plus les lignes de l'extrait mais quelques centaines de points
+au plus : totaux mensuels pour les quantités, et nombre, moyenne et centiles
+par acheteur ou approbateur pour les graphiques de performances. La taille de
+chaque figure sérialisée est mesurée et plafonnée par ``MAX_FIGURE_BYTES``.
+"""
+import os
+
+import plotly.express as px
+
+from procurement.stats import PERCENTILES
+
+# Taille maximale (en octets) d'une figure envoyée au navigateur
+MAX_FIGURE_BYTES = int(os.environ.get("PROCUREMENT_MAX_FIGURE_KB", "512")) * 1024
+
+# Nombre maximal de personnes affichées dans un graphique de performances (les plus actives)
+TOP_N_PEOPLE = 40
+
+# Graphiques de performances par rubrique : (valeur, personne, titre), deux par ligne
+PERFORMANCE_CHARTS = [
+    ("PROCUREMENT PERFORMANCES", [
+        ('PR Appr-RFQ Entry Dt', 'PO Buyer', "Jours entre l'approbation de PR et la saisie de RFQ"),
+        ('PR Appr-RC EDt', 'PO Buyer', "Jours entre l'approbation de PR et la saisie de RD"),
+        ('PR Appr-PO EDt', 'PO Buyer', "Jours entre l'approbation de PR et la création de PO"),
+        ('PO Appr-RC EDt', 'PO Buyer', "Jours entre l'approbation de PO et RD EDt"),
+    ]),
+    ("FINANCES PERFORMANCES", [
+        ('RC-VCH EDt', 'Vch Data Entered By', "Jours entre réception de Voucher et Vch Data Entrered"),
+        ('VCH Appr-PY EDt', 'Vch Data Entered By', "Jours entre VCH Appr-PY EDt"),
+    ]),
+    ("APPROBATION ET RECEPTION PERFORMANCES", [
+        ('PO TotApprv T', 'PO Last Approver', "Jours entre l'approbation des PO"),
+        ('PR-RC EDt', 'Rcpt Data Entered By', "Jours entre la réception des articles"),
+    ]),
+]
+
+
+def monthly_totals(df, columns):
+    """Sommes mensuelles des colonnes données, indexées par la colonne 'Date'."""
+    return df.groupby('Date', observed=True)[columns].sum().reset_index()
+
+
+def performance_summary(df, value_column, group_column, top_n=TOP_N_PEOPLE):
+    """Nombre, moyenne, centiles et maximum de ``value_column`` par ``group_column``.
+
+    Seules les ``top_n`` personnes ayant le plus de pièces sont gardées.
+    """
+    grouped = df.groupby(group_column, observed=True)[value_column]
+    summary = grouped.agg(Nombre='count', Moyenne='mean', Max='max')
+    quantiles = grouped.quantile(list(PERCENTILES.values())).unstack()
+    quantiles.columns = list(PERCENTILES)
+    summary = summary.join(quantiles)
+    summary = summary[summary['Nombre'] > 0].nlargest(top_n, 'Nombre')
+    return summary.sort_values('Moyenne').reset_index()
+
+
+def performance_figure(df, value_column, group_column, top_n=TOP_N_PEOPLE):
+    """Barres horizontales du délai moyen par personne, centiles en infobulle."""
+    return summary_figure(performance_summary(df, value_column, group_column, top_n), value_column, group_column)
+
+
+def summary_figure(summary, value_column, group_column):
+    """Figure d'un résumé de ``performance_summary``, quel que soit le moteur qui l'a calculé."""
+    fig = px.bar(
+        summary, x='Moyenne', y=group_column, orientation='h',
+        hover_data={'Nombre': True, 'P50': ':.0f', 'P90': ':.0f', 'P95': ':.0f', 'Max': ':.0f'},
+        labels={'Moyenne': f"{value_column} (moyenne en jours)"},
+    )
+    fig.update_traces(texttemplate='%{x:.0f}', textposition='outside')
+    fig.update_layout(title="", yaxis={'type': 'category'})
+    return fig
+
+
+def quantity_figures(monthly):
+    """Barres mensuelles des quantités commandées et reçues."""
+    # Graphique pour les Quantités Commandées avec des barres plus grosses
+    fig1 = px.bar(monthly, x='Date', y='Quantity Ordered', title="Quantités Commandées", labels={'Date': 'Date', 'Quantity Ordered': 'Quantité Commandée'})
+    fig1.update_layout(
+        xaxis_title='Mois',
+        yaxis_title='Quantité Commandée',
+        xaxis_tickformat="%b %Y",
+        template='plotly_dark',
+        barmode='group',
+        xaxis_tickangle=45,  # Angles de rotation des ticks de l'axe X
+        bargap=0.2,  # Espacement entre les barres
+        legend_title="Légende",  # Titre de la légende
+        legend=dict(
+            x=1,  # Position horizontale de la légende
+            y=1,  # Position verticale de la légende
+            traceorder='normal',  # Ordre des éléments de la légende
+            font=dict(size=14),  # Taille de la police de la légende
+            bgcolor='rgba(255, 255, 255, 0.5)',  # Couleur de fond de la légende
+            bordercolor='red',  # Bordure de la légende
+            borderwidth=2  # Largeur de la bordure de la légende
+        )
+    )
+
+    # Graphique pour les Quantités Reçues avec des barres plus grosses
+    fig2 = px.bar(monthly, x='Date', y='Quantity Received', title="Quantités Reçues", labels={'Date': 'Date', 'Quantity Received': 'Quantité Reçue'})
+    fig2.update_layout(
+        xaxis_title='Mois',
+        yaxis_title='Quantité Reçue',
+        xaxis_tickformat="%b %Y",
+        template='plotly_dark',
+        barmode='group',
+        xaxis_tickangle=40,  # Angles de rotation des ticks de l'axe X
+        bargap=0.2,  # Espacement entre les barres
+        legend_title="Légende",  # Titre de la légende
+        legend=dict(
+            x=1,  # Position horizontale de la légende
+            y=1,  # Position verticale de la légende
+            traceorder='normal',  # Ordre des éléments de la légende
+            font=dict(size=14),  # Taille de la police de la légende
+            bgcolor='rgba(215, 285, 255, 0.5)',  # Couleur de fond de la légende
+            bordercolor='red',  # Bordure de la légende
+            borderwidth=2  # Largeur de la bordure de la légende
+        )
+    )
+    return fig1, fig2
+
+
+def threshold_figure(counts, column):
+    """Barres des occurrences de chaque valeur d'un seuil d'approbation."""
+    fig = px.bar(counts, x=counts.index, y=counts.values,
+                 title=f"Occurrences de '{column}'", labels={'x': 'Valeur', 'y': 'Nombre d\'occurrences'})
+    fig.update_traces(
+        text=counts.values,
+        textposition='outside',
+        texttemplate='%{text}'
+    )
+    return fig
+
+
+def duration_means_figure(stats):
+    """Barres de la durée moyenne de chaque phase (tableau de ``stats.duration_stats``)."""
+    averages = stats['Moyenne']
+    fig = px.bar(averages, x=averages.index, y=averages.values)
+
+    # Ajouter les valeurs sur chaque barre
+    fig.update_traces(
+        text=averages.values,  # Afficher les valeurs des moyennes sur les barres
+        textposition='outside',  # Placer les valeurs à l'extérieur des barres
+        texttemplate='%{text:.1f}',  # Formater les valeurs avec 2 décimales
+        showlegend=False  # Masquer la légende
+    )
+    fig.update_layout(xaxis_title='-', yaxis_title='Moyenne en Jours')
+    return fig
+
+
+def duration_totals_figure(stats):
+    """Barres du total des jours de chaque phase (tableau de ``stats.duration_stats``)."""
+    totals = stats['Somme']
+    fig = px.bar(totals, x=totals.index, y=totals.values, color=totals.index)
+
+    # Ajouter les valeurs sur chaque barre
+    fig.update_traces(
+        text=totals.values,  # Afficher les valeurs sur les barres
+        textposition='outside',  # Placer les valeurs à l'extérieur des barres
+        texttemplate='%{text:.0f}',  # Formater les valeurs avec 0 décimales
+        showlegend=True  # Masquer la légende
+    )
+    fig.update_layout(xaxis_title='Nombre des jours', yaxis_title='Total en Jours')
+    return fig
+
+
+def figure_payload_bytes(fig):
+    """Taille en octets de la figure sérialisée en JSON, telle qu'envoyée au navigateur."""
+    return len(fig.to_json().encode('utf-8'))
+
+
+def figure_points(fig):
+    """Nombre de points tracés dans la figure."""
+    return sum(len(trace.x) if trace.x is not None else 0 for trace in fig.data)
@@ -0,0 +1,139 @@
+"""Cube des indicateurs, agrégé une fois au chargement.
+
+Les lignes de l'extrait sont regroupées par cellule, c'est-à-dire par
+combinaison des dimensions filtrables (``CUBE_DIMENSIONS``) et de la 'Date'.
+Chaque cellule porte des mesures additives : nombre de lignes, sommes des
+quantités, nombre, somme, somme des carrés et maximum de chaque durée, et
+occurrences de chaque valeur des seuils. Tant que les filtres ne portent que
+sur ces dimensions, les indicateurs s'obtiennent en agrégeant les cellules
+retenues, sans relire les lignes.
+
+Le cube n'est construit que s'il résume vraiment l'extrait : au-delà de
+``CUBE_MAX_RATIO`` cellule par ligne, il coûterait plus qu'il ne rapporte et
+les indicateurs restent calculés sur les lignes.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from procurement.filters import FilterIndex
+from procurement.metrics import QUANTITY_TOTALS, THRESHOLD_COLUMNS
+from procurement.schema import AGING_COLUMNS, DURATION_COLUMNS
+from procurement.stats import STAT_COLUMNS
+
+# Dimensions du cube ; 'Project ID' y figure parce que la barre latérale le filtre par défaut
+CUBE_DIMENSIONS = [
+    'Dept ID', 'Fund Code', 'Project ID', 'PR-Year', 'PR-Month', 'PO Buyer', 'PR Status', 'PO Status', 'Currency',
+]
+
+CUBE_DAY_COLUMNS = DURATION_COLUMNS + AGING_COLUMNS
+
+# Nombre maximal de cellules par ligne d'extrait pour que le cube soit construit
+CUBE_MAX_RATIO = float(os.environ.get("PROCUREMENT_CUBE_MAX_RATIO", "0.1"))
+
+
+class Rollup:
+    """Agrégats des cellules retenues par un jeu de filtres."""
+
+    def __init__(self, cube, cells):
+        self.cube = cube
+        self.cells = cells
+        # Hors OVERVIEW, seules les lignes datées comptent
+        self.dated = cells[cells['Date'].notna()]
+
+    def quantity_totals(self):
+        """Comme ``metrics.quantity_totals``, sur toutes les lignes retenues."""
+        return {label: float(self.cells[f"{col}|somme"].sum()) for label, col in QUANTITY_TOTALS}
+
+    def threshold_counts(self, column):
+        """Comme ``metrics.threshold_counts``, sur les lignes datées."""
+        values = self.cube.threshold_values[column]
+        counts = pd.Series(
+            [int(self.dated[f"{column}#{i}"].sum()) for i in range(len(values))],
+            index=pd.Index(values, name=column), name='count',
+        )
+        return counts[counts > 0].sort_values(ascending=False, kind='stable')
+
+    def duration_stats(self, columns):
+        """Comme ``stats.duration_stats``, sur les lignes datées, sans les centiles (non additifs)."""
+        rows = []
+        for col in columns:
+            n = int(self.dated[f"{col}|nombre"].sum())
+            if n == 0:
+                rows.append([0, 0.0] + [np.nan] * (len(STAT_COLUMNS) - 2))
+                continue
+            total = float(self.dated[f"{col}|somme"].sum())
+            sum_sq = float(self.dated[f"{col}|carres"].sum())
+            std = np.sqrt(max(sum_sq - total * total / n, 0.0) / (n - 1)) if n > 1 else np.nan
+            maximum = float(self.dated[f"{col}|max"].max())
+            rows.append([n, total, total / n, std, maximum] + [np.nan] * (len(STAT_COLUMNS) - 5))
+        return pd.DataFrame(rows, index=list(columns), columns=STAT_COLUMNS)
+
+    def monthly_totals(self, columns):
+        """Comme ``charts.monthly_totals``, par 'Date'."""
+        sums = [f"{col}|somme" for col in columns]
+        monthly = self.dated.groupby('Date')[sums].sum().reset_index()
+        return monthly.rename(columns=dict(zip(sums, columns)))
+
+
+class Cube:
+    """Cellules de l'extrait et index des filtres sur leurs dimensions."""
+
+    def __init__(self, df, grouped=None):
+        keys = [col for col in CUBE_DIMENSIONS if col in df.columns] + ['Date']
+        if grouped is None:
+            grouped = df.groupby(keys, observed=True, dropna=False, sort=False)
+        cell = grouped.ngroup().to_numpy()
+        cells = grouped.size().reset_index(name='lignes')
+        size = len(cells)
+
+        measures = {}
+        for _, col in QUANTITY_TOTALS:
+            values = pd.to_numeric(df[col])
+            sums = np.bincount(cell, weights=np.nan_to_num(values.to_numpy(dtype='float64')), minlength=size)
+            # Quantités entières : sommes entières, comme sur les lignes
+            measures[f"{col}|somme"] = np.rint(sums).astype('int64') if values.dtype.kind in 'iu' else sums
+        for col in CUBE_DAY_COLUMNS:
+            values = pd.to_numeric(df[col]).to_numpy(dtype='float64')
+            present = ~np.isnan(values)
+            at, values = cell[present], values[present]
+            maximum = np.full(size, -np.inf)
+            np.maximum.at(maximum, at, values)
+            measures[f"{col}|nombre"] = np.bincount(at, minlength=size)
+            measures[f"{col}|somme"] = np.bincount(at, weights=values, minlength=size)
+            measures[f"{col}|carres"] = np.bincount(at, weights=values * values, minlength=size)
+            measures[f"{col}|max"] = np.where(np.isinf(maximum), np.nan, maximum)
+        self.threshold_values = {}
+        for col in THRESHOLD_COLUMNS:
+            codes, values = pd.factorize(df[col], sort=True)
+            present = codes >= 0
+            counts = np.bincount(cell[present] * len(values) + codes[present], minlength=size * len(values))
+            counts = counts.reshape(size, len(values))
+            for i in range(len(values)):
+                measures[f"{col}#{i}"] = counts[:, i]
+            self.threshold_values[col] = list(values)
+
+        self.cells = pd.concat([cells, pd.DataFrame(measures)], axis=1)
+        self.index = FilterIndex(self.cells, columns=keys[:-1])
+
+    @classmethod
+    def build(cls, df, max_ratio=None):
+        """Construit le cube, ou retourne ``None`` s'il aurait plus de ``max_ratio`` cellule par ligne."""
+        keys = [col for col in CUBE_DIMENSIONS if col in df.columns] + ['Date']
+        grouped = df.groupby(keys, observed=True, dropna=False, sort=False)
+        if grouped.ngroups > (CUBE_MAX_RATIO if max_ratio is None else max_ratio) * max(len(df), 1):
+            return None
+        return cls(df, grouped)
+
+    def covers(self, selections):
+        """Vrai si aucune sélection ne porte sur une colonne hors des dimensions du cube."""
+        return all(not values or column in self.index.codes for column, values in selections)
+
+    def rollup(self, selections):
+        """Agrégats des cellules retenues ; les sélections doivent être couvertes par le cube."""
+        mask = self.index.mask([(column, values) for column, values in selections if column in self.index.codes])
+        return Rollup(self, self.cells if mask is None else self.cells[mask])
+
+    def nbytes(self):
+        return int(self.cells.memory_usage(index=True, deep=True).sum()) + self.index.nbytes()
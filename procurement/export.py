@@ -0,0 +1,189 @@
+"""Export en continu des lignes retenues par les filtres.
+
+Les lignes sont écrites par blocs de ``EXPORT_CHUNK_ROWS`` directement dans le
+fichier de sortie : CSV, Parquet (un groupe de lignes par bloc) ou xlsx en
+écriture seule (openpyxl ``write_only``, ou xlsxwriter en ``constant_memory``
+quand il est installé). Seul un bloc est copié à la fois : la mémoire reste
+bornée quelle que soit la taille de la sélection, au lieu d'une seconde copie
+du tableau et de tout le classeur en mémoire avec ``to_excel``.
+"""
+import importlib.util
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from procurement.ingest import evict_snapshots
+
+# Nombre de lignes écrites à la fois
+EXPORT_CHUNK_ROWS = int(os.environ.get("PROCUREMENT_EXPORT_CHUNK_ROWS", "50000"))
+
+# Répertoire des fichiers exportés et budget disque (en Mo) au-delà duquel les plus anciens sont supprimés
+EXPORT_DIR = Path(os.environ.get("PROCUREMENT_EXPORT_DIR", ".cache/exports"))
+EXPORT_BUDGET_MB = float(os.environ.get("PROCUREMENT_EXPORT_BUDGET_MB", "1024"))
+
+# Taille maximale (en Mo) d'un export proposé au téléchargement : Streamlit garde le fichier entier en mémoire
+EXPORT_DOWNLOAD_MAX_MB = float(os.environ.get("PROCUREMENT_EXPORT_DOWNLOAD_MAX_MB", "200"))
+
+# Moteur xlsx plus rapide, utilisé s'il est installé
+XLSXWRITER = importlib.util.find_spec("xlsxwriter") is not None
+
+# Formats proposés et leur type MIME
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Lignes d'une feuille Excel, en-tête compris
+XLSX_MAX_ROWS = 1_048_576
+
+
+def iter_chunks(df, mask=None, columns=None, chunk_rows=None):
+    """Blocs successifs des lignes retenues par ``mask`` (``None`` = toutes), limités aux colonnes données.
+
+    Un bloc vide est produit quand aucune ligne n'est retenue, pour que l'en-tête soit écrit.
+    """
+    chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+    columns = None if columns is None else list(columns)
+    positions = None if mask is None else np.flatnonzero(mask)
+    total = len(df) if positions is None else len(positions)
+    for start in range(0, max(total, 1), chunk_rows):
+        # Lignes d'abord : sélectionner les colonnes sur tout le tableau en copierait toutes les lignes
+        if positions is None:
+            chunk = df.iloc[start:start + chunk_rows]
+        else:
+            chunk = df.iloc[positions[start:start + chunk_rows]]
+        yield chunk if columns is None else chunk[columns]
+
+
+def _write_csv(chunks, path):
+    # BOM UTF-8 : Excel ouvre le fichier avec les accents corrects
+    with open(path, "w", encoding="utf-8-sig", newline="") as output:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(output, index=False, header=i == 0)
+
+
+def _parquet_schema(chunk, df):
+    """Schéma Arrow du premier bloc ; les colonnes texte vides dans ce bloc prennent le type de leur première valeur."""
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            first = df[field.name].first_valid_index()
+            if first is not None:
+                schema = schema.set(i, field.with_type(pa.array([df[field.name].at[first]]).type))
+    return schema
+
+
+def _write_parquet(chunks, path, df):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                writer = pq.ParquetWriter(path, _parquet_schema(chunk, df))
+            writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _records(chunk):
+    """Lignes d'un bloc en valeurs Python, valeurs manquantes à ``None``."""
+    values = chunk.astype(object)
+    return values.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def _write_xlsx(chunks, path):
+    if XLSXWRITER:
+        import xlsxwriter
+
+        workbook = xlsxwriter.Workbook(str(path), {"constant_memory": True, "remove_timezone": True})
+        try:
+            sheet = workbook.add_worksheet("Export")
+            date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+            row = 0
+            for chunk in chunks:
+                if row == 0:
+                    sheet.write_row(0, 0, list(chunk.columns))
+                    row = 1
+                for values in _records(chunk):
+                    for col, value in enumerate(values):
+                        if value is None:
+                            continue
+                        if hasattr(value, "to_pydatetime"):
+                            sheet.write_datetime(row, col, value.to_pydatetime(), date_format)
+                        else:
+                            sheet.write(row, col, value)
+                    row += 1
+        finally:
+            workbook.close()
+        return
+
+    import openpyxl
+
+    # Écriture seule : les lignes partent dans un fichier temporaire au fil de l'eau
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Export")
+    header = True
+    for chunk in chunks:
+        if header:
+            sheet.append(list(chunk.columns))
+            header = False
+        for values in _records(chunk):
+            sheet.append(values)
+    workbook.save(path)
+
+
+def export_path(digest, key, fmt, directory=None):
+    """Chemin du fichier exporté pour un extrait et un état des filtres."""
+    return Path(directory or EXPORT_DIR) / f"{digest}-{key}.{fmt}"
+
+
+def export_rows(df, mask, fmt, path, columns=None, chunk_rows=None):
+    """Écrit les lignes retenues dans ``path``, bloc par bloc.
+
+    Retourne le nombre de lignes, la durée (en secondes) et la taille du fichier (en octets).
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export inconnu : {fmt}")
+    rows = len(df) if mask is None else int(np.count_nonzero(mask))
+    if fmt == "xlsx" and rows + 1 > XLSX_MAX_ROWS:
+        raise ValueError(f"{rows} lignes dépassent la limite d'une feuille Excel ({XLSX_MAX_ROWS - 1}) : "
+                         "exportez en CSV ou en Parquet.")
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Fichier temporaire unique : deux sessions du même processus peuvent exporter la même sélection
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{path.name}.", suffix=".tmp", dir=path.parent)
+    os.close(fd)
+    tmp_path = Path(tmp_path)
+    start = time.perf_counter()
+    chunks = iter_chunks(df, mask, columns, chunk_rows)
+    try:
+        if fmt == "csv":
+            _write_csv(chunks, tmp_path)
+        elif fmt == "parquet":
+            _write_parquet(chunks, tmp_path, df)
+        else:
+            _write_xlsx(chunks, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return {"lignes": rows, "secondes": round(time.perf_counter() - start, 3), "octets": path.stat().st_size}
+
+
+def export_filtered(df, mask, fmt, digest, key, directory=None):
+    """Exporte les lignes retenues sous l'empreinte de l'extrait et des filtres ; retourne ``(chemin, mesures)``.
+
+    Au-delà de ``EXPORT_BUDGET_MB`` par format, les exports les plus anciens du répertoire sont supprimés.
+    """
+    path = export_path(digest, key, fmt, directory)
+    stats = export_rows(df, mask, fmt, path)
+    evict_snapshots(path.parent, EXPORT_BUDGET_MB, keep=path, pattern=f"*.{fmt}")
+    return path, stats
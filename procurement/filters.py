@@ -0,0 +1,200 @@
+"""Moteur de filtres de la barre latérale.
+
+Chaque colonne filtrable est factorisée une seule fois au chargement. Les
+colonnes de faible cardinalité gardent une bitmap compressée (``np.packbits``)
+par valeur ; les autres passent par une table de correspondance sur leurs codes.
+Les sélections sont combinées en un seul masque booléen, et les lignes filtrées
+ne sont matérialisées qu'une fois.
+
+Pour les options en cascade de la barre latérale, chaque filtre a besoin de la
+combinaison de tous les autres : ``without`` convertit chaque sélection en
+bitmap une seule fois et obtient ces combinaisons par conjonctions des
+préfixes et des suffixes.
+"""
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+# (libellé, colonne, sélection par défaut = toutes les valeurs) dans l'ordre de la barre latérale
+SIDEBAR_FILTERS = [
+    ("Bureau", 'Dept ID', True),
+    ("Projet", 'Fund Code', True),
+    ("Project ID", 'Project ID', True),
+    ("PO Buyer", 'PO Buyer', False),
+    ("Année", 'PR-Year', True),
+    ("Statut du PR", 'PR Status', True),
+    ("Devise", 'Currency', True),
+    ("Requisition/DA", 'Requisition ID', False),
+    ("PO/RFQ", 'RFQ ID', False),
+    ("Voucher", 'Voucher ID', False),
+    ("PR Status", 'PR Status', False),
+    ("PO Status", 'PO Status', False),
+]
+
+# Au-delà de ce nombre de valeurs distinctes, une bitmap par valeur coûterait trop de mémoire
+BITMAP_MAX_CARDINALITY = 256
+
+_OPTIONS_CACHE_SIZE = 256
+
+
+def _and(left, right):
+    """Conjonction de deux bitmaps compressées ; ``None`` ne filtre pas."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    return left & right
+
+
+def filter_state(selections):
+    """Clé hachable décrivant les sélections, pour mémoriser les calculs par état des filtres."""
+    return tuple((column, tuple(values)) for column, values in selections)
+
+
+def filter_key(selections):
+    """Empreinte stable des sélections, indépendante de l'ordre de choix des valeurs.
+
+    Sert de nom de fichier aux indicateurs précalculés : l'interface et le mode
+    batch obtiennent la même clé pour les mêmes filtres.
+    """
+    canonical = [[column, sorted(str(v) for v in values)] for column, values in selections]
+    return hashlib.sha1(json.dumps(canonical, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+def default_selections(index):
+    """Sélections initiales de la barre latérale : toutes les valeurs, ou aucune selon le filtre."""
+    return [(column, index.all_options(column) if tout else []) for _, column, tout in SIDEBAR_FILTERS]
+
+
+class FilterIndex:
+    """Index des valeurs de chaque colonne filtrable d'un extrait."""
+
+    def __init__(self, df, columns=None):
+        if columns is None:
+            columns = list(dict.fromkeys(col for _, col, _ in SIDEBAR_FILTERS))
+        self.n_rows = len(df)
+        self.codes = {}
+        self.uniques = {}
+        self.bitmaps = {}
+        # Lignes où la colonne a une valeur : la bitmap d'une sélection de toutes les valeurs
+        self.valid = {}
+        self._options_cache = {}
+        for col in columns:
+            try:
+                codes, uniques = pd.factorize(df[col], sort=True)
+            except TypeError:
+                codes, uniques = pd.factorize(df[col])
+            self.codes[col] = codes
+            self.uniques[col] = pd.Index(uniques)
+            self.valid[col] = np.packbits(codes >= 0)
+            if len(uniques) <= BITMAP_MAX_CARDINALITY:
+                bitmaps = np.zeros((len(uniques), (self.n_rows + 7) // 8), dtype=np.uint8)
+                for i in range(len(uniques)):
+                    bitmaps[i] = np.packbits(codes == i)
+                self.bitmaps[col] = bitmaps
+
+    def nbytes(self):
+        """Mémoire occupée par les codes, les valeurs et les bitmaps."""
+        return int(sum(codes.nbytes for codes in self.codes.values())
+                   + sum(uniques.memory_usage(deep=True) for uniques in self.uniques.values())
+                   + sum(bitmaps.nbytes for bitmaps in self.bitmaps.values())
+                   + sum(valid.nbytes for valid in self.valid.values()))
+
+    def all_options(self, column):
+        """Liste de toutes les valeurs (hors NaN) de la colonne, triées."""
+        return list(self.uniques[column])
+
+    def _positions(self, column, values):
+        positions = self.uniques[column].get_indexer(pd.Index(list(values)))
+        return positions[positions >= 0]
+
+    def _packed(self, column, values):
+        """Bitmap compressée des lignes dont la colonne prend une des valeurs données."""
+        positions = self._positions(column, values)
+        if len(positions) == len(self.uniques[column]):
+            # Sélection par défaut de toutes les valeurs : pas de OU sur chaque bitmap
+            return self.valid[column]
+        if column in self.bitmaps:
+            if not len(positions):
+                return np.zeros(self.bitmaps[column].shape[1], dtype=np.uint8)
+            return np.bitwise_or.reduce(self.bitmaps[column][positions], axis=0)
+        lut = np.zeros(len(self.uniques[column]) + 1, dtype=bool)
+        lut[positions] = True
+        # Le code -1 (NaN) tombe sur la dernière case, toujours fausse
+        return np.packbits(lut[self.codes[column]])
+
+    def _combine(self, selections, skip=None):
+        packed = None
+        for i, (column, values) in enumerate(selections):
+            if i == skip or not values:
+                continue
+            bits = self._packed(column, values)
+            packed = bits if packed is None else packed & bits
+        return packed
+
+    def without(self, selections):
+        """Pour chaque position, bitmap compressée de toutes les autres sélections (``None`` : rien ne filtre).
+
+        Chaque sélection n'est convertie qu'une fois ; la combinaison « toutes sauf ``i`` » est la
+        conjonction des sélections qui précèdent et de celles qui suivent ``i``.
+        """
+        bits = [self._packed(column, values) if values else None for column, values in selections]
+        suffixes = [None] * (len(bits) + 1)
+        for i in range(len(bits) - 1, -1, -1):
+            suffixes[i] = _and(bits[i], suffixes[i + 1])
+        result, prefix = [], None
+        for i, packed in enumerate(bits):
+            result.append(_and(prefix, suffixes[i + 1]))
+            prefix = _and(prefix, packed)
+        return result
+
+    def unpack(self, packed):
+        """Masque booléen d'une bitmap compressée ; ``None`` (toutes les lignes) reste ``None``."""
+        if packed is None:
+            return None
+        return np.unpackbits(packed, count=self.n_rows).view(bool)
+
+    def mask(self, selections, skip=None):
+        """Masque booléen des lignes retenues.
+
+        ``selections`` est une liste de couples ``(colonne, valeurs)`` ; une liste
+        vide ne filtre pas, comme dans la barre latérale. ``skip`` ignore la
+        sélection de cette position. Retourne ``None`` si rien n'est filtré.
+        """
+        return self.unpack(self._combine(selections, skip))
+
+    def apply(self, df, selections):
+        """Retourne les lignes de ``df`` retenues par les sélections, copiées une seule fois."""
+        mask = self.mask(selections)
+        if mask is None or mask.all():
+            return df
+        return df[mask]
+
+    def options(self, position, selections, without=None):
+        """Valeurs encore présentes pour le filtre ``position`` sous les autres sélections.
+
+        ``without`` est le résultat de ``without(selections)`` quand toutes les options de la
+        barre latérale sont demandées pour le même état des filtres.
+        """
+        column = selections[position][0]
+        key = (position, filter_state(selections))
+        cached = self._options_cache.get(key)
+        if cached is not None:
+            return cached
+        packed = self._combine(selections, skip=position) if without is None else without[position]
+        if packed is None:
+            # Toutes les valeurs factorisées sont présentes dans l'extrait
+            result = list(self.uniques[column])
+        elif column in self.bitmaps:
+            # Une valeur est présente si sa bitmap croise celle des autres sélections
+            result = list(self.uniques[column][(self.bitmaps[column] & packed).any(axis=1)])
+        else:
+            codes = self.codes[column][self.unpack(packed)]
+            present = np.bincount(codes[codes >= 0], minlength=len(self.uniques[column])) > 0
+            result = list(self.uniques[column][present])
+        if len(self._options_cache) >= _OPTIONS_CACHE_SIZE:
+            self._options_cache.clear()
+        self._options_cache[key] = result
+        return result
@@ -0,0 +1,111 @@
+"""Index des identifiants (Requisition, RFQ, Voucher) et recherche par préfixe.
+
+Construit une fois par extrait à partir des codes déjà factorisés par
+``FilterIndex`` : la recherche d'un identifiant passe par la table de hachage
+de ``pd.Index`` puis lit directement ses positions de lignes, et la saisie
+semi-automatique parcourt une liste triée des identifiants sous forme de texte.
+"""
+import numpy as np
+import pandas as pd
+
+# Colonnes recherchées par préfixe au lieu d'être listées en entier dans le navigateur
+ID_SEARCH_COLUMNS = ['Requisition ID', 'RFQ ID', 'Voucher ID']
+
+# Nombre de suggestions renvoyées par défaut
+SEARCH_LIMIT = 50
+
+
+def _as_text(uniques):
+    """Forme texte des identifiants ; les numéros stockés en flottants s'affichent sans '.0'."""
+    values = pd.Series(uniques)
+    if pd.api.types.is_float_dtype(values) and (values == values.round()).all():
+        values = values.astype('int64')
+    return values.astype(str).str.lower().to_numpy()
+
+
+class IdIndex:
+    """Table identifiant -> positions de lignes, avec recherche par préfixe."""
+
+    def __init__(self, codes, uniques):
+        self.uniques = pd.Index(uniques)
+        # Codes partagés avec FilterIndex, pas une copie : sert au filtrage des suggestions par masque
+        self._codes = codes
+        valid = np.flatnonzero(codes >= 0)
+        # Positions de lignes regroupées par identifiant, dans l'ordre de l'extrait
+        self._rows = valid[np.argsort(codes[valid], kind='stable')]
+        counts = np.bincount(codes[valid], minlength=len(self.uniques))
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+        if len(self.uniques):
+            # pandas construit la table de hachage au premier get_loc : autant le faire ici, une fois
+            self.uniques.get_loc(self.uniques[0])
+        text = _as_text(uniques)
+        self._text_order = np.argsort(text, kind='stable')
+        self._text = text[self._text_order]
+
+    @classmethod
+    def from_filter_index(cls, filter_index, column):
+        return cls(filter_index.codes[column], filter_index.uniques[column])
+
+    def nbytes(self):
+        """Mémoire occupée par la table et l'ordre de recherche."""
+        return int(self.uniques.memory_usage(deep=True) + self._rows.nbytes + self._offsets.nbytes
+                   + self._text_order.nbytes + self._text.nbytes)
+
+    def rows(self, value):
+        """Positions (dans l'extrait complet) des lignes portant cet identifiant."""
+        try:
+            position = self.uniques.get_loc(value)
+        except KeyError:
+            return np.empty(0, dtype=np.intp)
+        return self._rows[self._offsets[position]:self._offsets[position + 1]]
+
+    def search(self, prefix, limit=SEARCH_LIMIT, mask=None):
+        """Jusqu'à ``limit`` identifiants commençant par ``prefix`` (sans tenir compte de la casse).
+
+        Avec ``mask`` (booléen sur les lignes de l'extrait), seuls les identifiants
+        ayant au moins une ligne retenue sont proposés.
+        """
+        prefix = str(prefix).strip().lower()
+        start = np.searchsorted(self._text, prefix, side='left')
+        stop = np.searchsorted(self._text, prefix + '\U0010ffff', side='left') if prefix else len(self._text)
+        positions = self._text_order[start:stop]
+        if mask is not None and len(positions):
+            positions = self._retained(positions, mask, limit)
+        return [self.uniques[position] for position in positions[:limit]]
+
+    def _retained(self, positions, mask, limit):
+        """Identifiants de ``positions`` ayant une ligne retenue par ``mask``, dans l'ordre, ``limit`` au moins.
+
+        Les candidats sont vérifiés par tranches croissantes dans l'ordre d'affichage : les premières
+        suggestions sont en général trouvées sans lire tout le masque. La première tranche est
+        dimensionnée sur la densité du masque ; quand une tranche coûterait plus qu'une passe sur
+        le masque (masque très sélectif), cette passe unique la remplace.
+        """
+        retained = int(np.count_nonzero(mask))
+        if not retained:
+            return positions[:0]
+        per_id = len(self._rows) / len(self.uniques)
+        share = 1 - (1 - retained / len(mask)) ** per_id
+        found, count, done = [], 0, 0
+        chunk = int(2 * limit / share) + 1
+        while done < len(positions) and count < limit:
+            # Une lecture de ligne par indirection vaut environ huit lectures séquentielles du masque
+            if chunk * per_id * 8 >= len(mask):
+                kept = self._codes[mask]
+                present = np.bincount(kept[kept >= 0], minlength=len(self.uniques)) > 0
+                rest = positions[done:]
+                found.append(rest[present[rest]])
+                break
+            part = positions[done:done + chunk]
+            starts = self._offsets[part]
+            lengths = self._offsets[part + 1] - starts
+            part, starts, lengths = part[lengths > 0], starts[lengths > 0], lengths[lengths > 0]
+            # Lignes de chaque candidat mises bout à bout, puis un OU par candidat
+            first = np.cumsum(lengths) - lengths
+            rows = self._rows[np.repeat(starts - first, lengths) + np.arange(int(lengths.sum()))]
+            part = part[np.logical_or.reduceat(mask[rows], first)] if len(part) else part
+            found.append(part)
+            count += len(part)
+            done += chunk
+            chunk *= 4
+        return np.concatenate(found) if found else positions[:0]
@@ -0,0 +1,126 @@
+"""Ingestion des extraits PeopleSoft.
+
+Chaque extrait chargé est identifié par le hachage SHA-256 de son contenu.
+Il n'est analysé qu'une seule fois : le résultat (déjà traduit par
+``DEPT_MAPPING``) est enregistré sous forme d'instantané Parquet dans
+``CACHE_DIR``. Les relances Streamlit, les autres sessions et les
+redémarrages de l'application relisent cet instantané au lieu d'appeler
+``pd.read_excel``.
+"""
+import hashlib
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from procurement.reader import read_extract, read_extracts
+from procurement.schema import apply_schema
+
+# Mapping des valeurs de la colonne 'Dept ID'
+DEPT_MAPPING = {
+    "CD0001": "Kinshasa", "CD0002": "Goma", "CD-SPC": "Congo SPC",
+    "CD0003": "Kasongo", "CD0004": "Kindu", "CD0005": "Butembo", "CD0006": "Beni",
+    "CD0007": "Lubero", "CD0008": "Kirumba", "CD0009": "Mbujimayi", "CD0010": "Kalima",
+    "CD0013": "Uvira", "CD0014": "Mweneditu"
+}
+
+# Répertoire des instantanés et budget disque (en Mo), configurables par variables d'environnement
+CACHE_DIR = Path(os.environ.get("PROCUREMENT_CACHE_DIR", ".cache/extracts"))
+CACHE_BUDGET_MB = float(os.environ.get("PROCUREMENT_CACHE_BUDGET_MB", "2048"))
+
+# Incrémenté quand le traitement appliqué avant l'instantané change, pour invalider les anciens fichiers
+SNAPSHOT_VERSION = 3
+
+
+def content_hash(data):
+    """Retourne l'empreinte SHA-256 (hexadécimale) du contenu d'un fichier chargé."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def map_departments(df):
+    """Traduit 'Dept ID' par ``DEPT_MAPPING`` et rend les colonnes objet compatibles Parquet."""
+    # Colonne absente : c'est la validation du schéma qui la signale
+    if 'Dept ID' in df.columns:
+        df['Dept ID'] = df['Dept ID'].map(DEPT_MAPPING)
+    return _arrow_safe(df)
+
+
+def files_hash(files):
+    """Empreinte d'une liste de fichiers ``(contenu, nom)`` ; celle du contenu pour un seul fichier."""
+    if len(files) == 1:
+        return content_hash(files[0][0])
+    return content_hash("".join(content_hash(data) for data, _ in files).encode("ascii"))
+
+
+def parse_extract(data, filename):
+    """Analyse le contenu brut d'un extrait PeopleSoft, applique ``DEPT_MAPPING`` puis le schéma."""
+    return apply_schema(map_departments(read_extract(data, filename)))
+
+
+def parse_extracts(files):
+    """Comme ``parse_extract`` pour plusieurs fichiers ``(contenu, nom)``, lus en parallèle."""
+    return apply_schema(map_departments(read_extracts(files)))
+
+
+def _arrow_safe(df):
+    """Convertit en texte les colonnes objet de types mélangés, que Parquet ne sait pas stocker."""
+    for col in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col], skipna=True) not in ("string", "empty"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def snapshot_path(digest, cache_dir=None):
+    """Chemin de l'instantané Parquet correspondant à une empreinte."""
+    return Path(cache_dir or CACHE_DIR) / f"{digest}-v{SNAPSHOT_VERSION}.parquet"
+
+
+def load_extract(data, filename, digest=None, cache_dir=None, budget_mb=None):
+    """Charge un extrait depuis son instantané Parquet, ou l'analyse puis l'enregistre.
+
+    Retourne le couple ``(digest, df)``.
+    """
+    return load_extracts([(data, filename)], digest, cache_dir, budget_mb)
+
+
+def load_extracts(files, digest=None, cache_dir=None, budget_mb=None):
+    """Comme ``load_extract`` pour un ou plusieurs fichiers ``(contenu, nom)``, réunis en un seul extrait."""
+    digest = digest or files_hash(files)
+    path = snapshot_path(digest, cache_dir)
+    if path.exists():
+        try:
+            df = pd.read_parquet(path)
+            # Le mtime sert d'horodatage de dernier accès pour l'éviction
+            os.utime(path)
+            return digest, df
+        except (OSError, ValueError):
+            # Instantané tronqué ou illisible : on le reconstruit
+            path.unlink(missing_ok=True)
+
+    df = parse_extracts(files)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    evict_snapshots(cache_dir, budget_mb, keep=path)
+    return digest, df
+
+
+def evict_snapshots(cache_dir=None, budget_mb=None, keep=None, pattern="*.parquet"):
+    """Supprime les instantanés les moins récemment utilisés au-delà du budget disque.
+
+    Retourne la liste des fichiers supprimés. ``keep`` n'est jamais supprimé.
+    """
+    budget = (CACHE_BUDGET_MB if budget_mb is None else budget_mb) * 1024 * 1024
+    snapshots = sorted(Path(cache_dir or CACHE_DIR).glob(pattern), key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in snapshots)
+    removed = []
+    for p in snapshots:
+        if total <= budget:
+            break
+        if keep is not None and p == Path(keep):
+            continue
+        total -= p.stat().st_size
+        p.unlink(missing_ok=True)
+        removed.append(p)
+    return removed
@@ -0,0 +1,173 @@
+"""Indicateurs du tableau de bord, calculables sans Streamlit.
+
+Les mêmes fonctions servent à l'interface et au mode batch
+(``python -m procurement.batch``) : comptes distincts de l'OVERVIEW, totaux
+des quantités et des valeurs, occurrences des seuils, statistiques des durées
+et âges moyens. Les résultats précalculés sont rangés par empreinte d'extrait
+et par clé de filtres dans ``PRECOMPUTED_DIR``, où l'interface les relit.
+"""
+import json
+import math
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from procurement.schema import AGING_COLUMNS, DURATION_COLUMNS
+from procurement.stats import STAT_COLUMNS, duration_stats
+
+# Répertoire des indicateurs précalculés par le mode batch
+PRECOMPUTED_DIR = Path(os.environ.get("PROCUREMENT_PRECOMPUTED_DIR", ".cache/kpis"))
+
+# Comptes distincts de l'OVERVIEW : (libellé, colonne)
+OVERVIEW_COUNTS = [
+    ("Réquisitions", 'Requisition ID'),
+    ("Nombre RFQ", 'RFQ ID'),
+    ("Nombre PO", 'PO No.'),
+    ("PO Reçu", 'Receipt Nbr'),
+    ("Nb vouchers", 'Voucher ID'),
+    ("Nb Paiements", 'Vch Pymt Ref'),
+    ("Paiements", 'Vch Last Approver'),
+]
+
+# Totaux de l'OVERVIEW : (libellé, colonne)
+QUANTITY_TOTALS = [
+    ("Quantités commandées", 'Quantity Ordered'),
+    ("Quantités recues", 'Quantity Received'),
+    ("Balance", 'Balance Pending to be Rcvd'),
+    ("Valeurs engagées", 'Item Total'),
+]
+
+THRESHOLD_COLUMNS = ['Threshold 1', 'Threshold 2', 'Threshold 3']
+
+
+def overview_counts(df):
+    """Nombre de valeurs distinctes de chaque identifiant de l'OVERVIEW."""
+    return {label: int(df[col].nunique()) for label, col in OVERVIEW_COUNTS}
+
+
+class DistinctCounts:
+    """Identifiants de l'OVERVIEW factorisés une fois, puis comptés sous un masque de lignes.
+
+    Chaque compte marque les codes présents dans un tableau de booléens (un par
+    valeur distincte) au lieu de hacher les chaînes des lignes retenues.
+    """
+
+    def __init__(self, df, filter_index=None):
+        self.codes = {}
+        self.sizes = {}
+        for _, col in OVERVIEW_COUNTS:
+            if filter_index is not None and col in filter_index.codes:
+                # Codes déjà calculés par l'index des filtres
+                codes, size = filter_index.codes[col], len(filter_index.uniques[col])
+            else:
+                codes, uniques = pd.factorize(df[col])
+                size = len(uniques)
+                codes = codes.astype(np.int32) if size < 2 ** 31 else codes
+            self.codes[col] = codes
+            self.sizes[col] = size
+
+    def counts(self, mask=None):
+        """Comme ``overview_counts``, sur les lignes retenues par ``mask`` (toutes si ``None``)."""
+        return {label: self.count(col, mask) for label, col in OVERVIEW_COUNTS}
+
+    def count(self, column, mask=None):
+        if mask is None:
+            return self.sizes[column]
+        seen = np.zeros(self.sizes[column] + 1, dtype=bool)
+        # Le code -1 (valeur absente) tombe sur la dernière case, ignorée
+        seen[self.codes[column][mask]] = True
+        return int(np.count_nonzero(seen[:-1]))
+
+    def nbytes(self):
+        return int(sum(codes.nbytes for codes in self.codes.values()))
+
+
+def quantity_totals(df):
+    """Sommes des quantités et des valeurs engagées."""
+    return {label: float(df[col].sum()) for label, col in QUANTITY_TOTALS}
+
+
+def threshold_counts(df, column):
+    """Occurrences de chaque valeur d'un seuil d'approbation (valeurs absentes exclues)."""
+    counts = df[column].value_counts()
+    return counts[counts > 0]
+
+
+def aging_means(df):
+    """Âge moyen (en jours) des PR, PO, RC et VCH."""
+    return duration_stats(df, AGING_COLUMNS)['Moyenne'].to_dict()
+
+
+def compute_kpis(df):
+    """Tous les indicateurs du tableau de bord pour un extrait déjà filtré.
+
+    Comme dans l'interface, l'OVERVIEW porte sur toutes les lignes et le reste
+    sur les lignes dont la 'Date' est connue.
+    """
+    dated = df.dropna(subset=['Date'])
+    return {
+        "lignes": len(df),
+        "overview": overview_counts(df),
+        "totaux": quantity_totals(df),
+        "seuils": {col: {str(k): int(v) for k, v in threshold_counts(dated, col).items()} for col in THRESHOLD_COLUMNS},
+        "durees": duration_stats(dated, DURATION_COLUMNS).to_dict(orient='index'),
+        "ages": aging_means(dated),
+    }
+
+
+def durations_frame(kpis):
+    """Tableau des statistiques des durées à partir d'indicateurs (éventuellement relus en JSON)."""
+    table = pd.DataFrame.from_dict(kpis["durees"], orient='index')
+    return table.reindex(columns=STAT_COLUMNS).astype('float64')
+
+
+def _json_ready(value):
+    if isinstance(value, dict):
+        return {str(k): _json_ready(v) for k, v in value.items()}
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, 'item'):
+        return _json_ready(value.item())
+    return value
+
+
+def kpis_frame(kpis):
+    """Indicateurs à plat (section, indicateur, statistique, valeur), pour l'export Parquet."""
+    rows = []
+    for section, content in kpis.items():
+        if not isinstance(content, dict):
+            rows.append((section, section, "", float(content)))
+            continue
+        for name, value in content.items():
+            if isinstance(value, dict):
+                rows.extend((section, name, stat, v) for stat, v in value.items())
+            else:
+                rows.append((section, name, "", value))
+    frame = pd.DataFrame(rows, columns=['section', 'indicateur', 'statistique', 'valeur'])
+    frame['valeur'] = pd.to_numeric(frame['valeur'], errors='coerce')
+    return frame
+
+
+def precomputed_path(digest, key, directory=None, fmt="json"):
+    return Path(directory or PRECOMPUTED_DIR) / digest / f"{key}.{fmt}"
+
+
+def save_kpis(kpis, digest, key, directory=None, fmt="json"):
+    """Enregistre des indicateurs précalculés ; retourne le chemin écrit."""
+    path = precomputed_path(digest, key, directory, fmt)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == "parquet":
+        kpis_frame(kpis).to_parquet(path, index=False)
+    else:
+        path.write_text(json.dumps(_json_ready(kpis), ensure_ascii=False, indent=1), encoding='utf-8')
+    return path
+
+
+def load_kpis(digest, key, directory=None):
+    """Relit des indicateurs précalculés en JSON, ou ``None`` s'ils n'existent pas."""
+    path = precomputed_path(digest, key, directory)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding='utf-8'))
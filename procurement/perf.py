@@ -0,0 +1,198 @@
+"""Instrumentation des relances du tableau de bord.
+
+Chaque étape chronométrée produit une mesure : durée, pic de mémoire (quand
+``tracemalloc`` est actif), lignes en entrée et en sortie. Les mesures d'une
+relance, avec la taille des figures envoyées, sont ajoutées en une ligne JSON
+au journal ``PERF_LOG``, étiquetées par l'empreinte de l'extrait et l'état des
+filtres, pour retrouver en production les combinaisons lentes.
+
+``tracemalloc`` est global au processus, partagé par toutes les sessions. Une
+seule relance à la fois le démarre et lit ses pics : celle d'une session dont le
+panneau de performance est ouvert, la première à l'obtenir ; pour les autres, le
+pic de mémoire est indisponible. Pendant cette relance, le traçage porte sur
+toutes les allocations du processus : les relances des autres sessions qui
+tournent en même temps sont ralenties, et leurs allocations comptent dans le
+pic relevé. Le pic d'une étape (``pic_mo``) est donc celui du processus ; les
+étapes mesurées pendant qu'une autre relance tournait sont marquées
+``autres_relances``, leur pic n'est pas celui de la seule relance mesurée.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Journal JSON-lines des relances ; une valeur vide le désactive
+PERF_LOG = os.environ.get("PROCUREMENT_PERF_LOG", ".cache/perf.jsonl")
+
+# Au-delà de cette taille (en Mo), le journal est renommé en .1 et un nouveau commence
+PERF_LOG_MAX_MB = float(os.environ.get("PROCUREMENT_PERF_LOG_MAX_MB", "50"))
+
+# Relances en cours dans le processus et nombre de relances commencées, pour marquer les étapes
+# dont le pic de mémoire mêle les allocations d'autres sessions
+_runs_lock = threading.Lock()
+_active_runs = weakref.WeakSet()
+_runs_started = 0
+
+
+def _run_activity(recorder):
+    """Relances commencées jusqu'ici et autres relances en cours que ``recorder``."""
+    with _runs_lock:
+        return _runs_started, sum(1 for run in _active_runs if run is not recorder)
+
+
+# Relance qui pilote tracemalloc : référence faible vers son PerfRecorder, None si personne
+_tracer_lock = threading.Lock()
+_tracer_owner = None
+
+
+def _acquire_tracer(recorder):
+    """Démarre le traçage pour ``recorder`` ; faux si une autre relance ou un autre outil le détient déjà."""
+    global _tracer_owner
+    with _tracer_lock:
+        owner = _tracer_owner() if _tracer_owner is not None else None
+        if owner is recorder:
+            return True
+        if owner is not None or (_tracer_owner is None and tracemalloc.is_tracing()):
+            # Traçage d'une autre session, ou lancé hors du tableau de bord (benchmark) : on n'y touche pas
+            return False
+        # Libre, ou détenu par une session disparue : le traçage déjà démarré est repris tel quel
+        _tracer_owner = weakref.ref(recorder)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return True
+
+
+def _release_tracer(recorder):
+    """Arrête le traçage si ``recorder`` le détient ; sans effet sinon."""
+    global _tracer_owner
+    with _tracer_lock:
+        if _tracer_owner is not None and _tracer_owner() is recorder:
+            _tracer_owner = None
+            tracemalloc.stop()
+
+
+@contextmanager
+def measure_stage(stage, rows_in=None, memory=None):
+    """Mesure le bloc ``with`` ; le dictionnaire produit peut recevoir ``lignes_sortie``.
+
+    Le pic de mémoire n'est relevé que si ``tracemalloc`` trace les allocations et, quand ``memory``
+    est donné, seulement s'il est vrai : ``reset_peak`` fausserait le pic d'une autre relance.
+    """
+    tracing = tracemalloc.is_tracing() and memory is not False
+    if tracing:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    record = {"etape": stage, "secondes": None, "pic_mo": None, "lignes_entree": rows_in, "lignes_sortie": None}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["secondes"] = round(time.perf_counter() - start, 4)
+        if tracing:
+            record["pic_mo"] = round((tracemalloc.get_traced_memory()[1] - baseline) / 2 ** 20, 1)
+
+
+class PerfRecorder:
+    """Mesures des relances d'une session, écrites au journal à la fin de chaque relance."""
+
+    def __init__(self, log_path=PERF_LOG):
+        self.log_path = Path(log_path) if log_path else None
+        self.current = None
+        self.last = None
+        # Pic de mémoire demandé par le panneau de performance de la session
+        self.memory = False
+        self.tracing = False
+
+    def start_run(self, kind="script", extract=None, filters=None):
+        global _runs_started
+        with _runs_lock:
+            _active_runs.add(self)
+            _runs_started += 1
+        # Une relance interrompue (st.stop) n'a pas rendu le traçage : il est repris ou rendu ici
+        if self.memory:
+            self.tracing = _acquire_tracer(self)
+        else:
+            _release_tracer(self)
+            self.tracing = False
+        self.current = {
+            "horodatage": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "relance": kind,
+            "extrait": extract,
+            "filtres": filters,
+            "etapes": [],
+            "figures": [],
+            # Portée du pic de mémoire relevé : le processus entier, ou rien si une autre relance trace
+            "memoire": "processus" if self.tracing else None,
+            "_debut": time.perf_counter(),
+        }
+
+    def tag(self, extract=None, filters=None):
+        """Associe l'extrait et l'état des filtres à la relance en cours."""
+        if self.current is not None:
+            self.current.update(extrait=extract, filtres=filters)
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        if self.tracing:
+            started, others = _run_activity(self)
+        with measure_stage(name, rows_in, memory=self.tracing) as record:
+            yield record
+        if self.tracing:
+            started_after, others_after = _run_activity(self)
+            # Une autre relance en cours au début ou à la fin, ou commencée pendant l'étape
+            record["autres_relances"] = bool(others or others_after or started_after != started)
+        if self.current is not None:
+            self.current["etapes"].append(record)
+
+    def add_figure(self, title, points, nbytes):
+        if self.current is not None:
+            self.current["figures"].append({"graphique": title, "points": points, "octets": nbytes})
+
+    def finish_run(self):
+        """Clôt la relance en cours et l'ajoute au journal ; retourne ses mesures."""
+        run, self.current = self.current, None
+        with _runs_lock:
+            _active_runs.discard(self)
+        # Entre deux relances, le traçage ne ralentit pas les autres sessions
+        _release_tracer(self)
+        self.tracing = False
+        if run is None:
+            return None
+        run["secondes"] = round(time.perf_counter() - run.pop("_debut"), 4)
+        run["octets_figures"] = sum(f["octets"] for f in run["figures"])
+        self.last = run
+        self._append(run)
+        return run
+
+    @contextmanager
+    def fragment(self, name):
+        """Mesure un fragment : dans une relance complète c'est une étape, seul il devient une relance."""
+        if self.current is not None:
+            with self.stage(name):
+                yield
+            return
+        previous = self.last or {}
+        self.start_run(kind=name, extract=previous.get("extrait"), filters=previous.get("filtres"))
+        try:
+            with self.stage(name):
+                yield
+        finally:
+            self.finish_run()
+
+    def _append(self, run):
+        if self.log_path is None:
+            return
+        try:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            if self.log_path.exists() and self.log_path.stat().st_size > PERF_LOG_MAX_MB * 2 ** 20:
+                os.replace(self.log_path, self.log_path.with_suffix(self.log_path.suffix + ".1"))
+            with open(self.log_path, "a", encoding="utf-8") as log:
+                log.write(json.dumps(run, ensure_ascii=False, default=str) + "\n")
+        except OSError:
+            # Le journal ne doit jamais empêcher l'affichage du tableau de bord
+            pass
@@ -0,0 +1,191 @@
+"""Requêtes paresseuses sur les fichiers Parquet, avec DuckDB quand il est installé.
+
+Les filtres de la barre latérale, les indicateurs et les résumés de
+performances s'expriment chacun en une requête SQL sur les instantanés Parquet
+des extraits ou sur les partitions de l'historique. DuckDB ne lit que les
+colonnes citées, écarte les groupes de lignes exclus par les filtres (sur les
+statistiques min/max des fichiers) et utilise tous les cœurs.
+
+Le moteur s'active avec ``PROCUREMENT_QUERY_BACKEND=duckdb`` (et ``pip install
+duckdb``). Tant que l'extrait tient en mémoire, l'index des filtres et les calculs
+pandas restent plus rapides sur une machine à peu de cœurs : les requêtes servent
+aux historiques de plusieurs années, sur des serveurs multicœurs. Sinon,
+``available()`` est faux et le tableau de bord garde ses calculs pandas.
+
+Sur l'historique, le tableau de bord ne charge alors que les colonnes des
+filtres, de la date et du suivi d'une demande : les options en cascade de la
+barre latérale et le suivi restent calculés en mémoire, les indicateurs et les
+graphiques viennent des requêtes. Toutes les colonnes ne sont relues qu'à la
+demande, pour l'export ou le repli pandas quand une requête échoue. Un extrait
+chargé depuis un fichier est, lui, déjà entier en mémoire : les requêtes n'y
+remplacent que les calculs.
+"""
+import importlib.util
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from procurement import store
+from procurement.charts import TOP_N_PEOPLE
+from procurement.ingest import snapshot_path
+from procurement.metrics import OVERVIEW_COUNTS, QUANTITY_TOTALS, THRESHOLD_COLUMNS
+from procurement.schema import AGING_COLUMNS, DURATION_COLUMNS
+from procurement.stats import PERCENTILES, STAT_COLUMNS
+
+# Moteur des indicateurs : 'pandas' (par défaut) ou 'duckdb' pour les requêtes sur les fichiers Parquet
+QUERY_BACKEND = os.environ.get("PROCUREMENT_QUERY_BACKEND", "pandas")
+
+DUCKDB = importlib.util.find_spec("duckdb") is not None
+
+
+class QueryError(RuntimeError):
+    """Requête impossible (fichier illisible ou retiré, schéma inattendu) : repli sur pandas."""
+
+
+def available():
+    """Vrai si les requêtes paresseuses peuvent remplacer les calculs pandas."""
+    return QUERY_BACKEND == "duckdb" and DUCKDB
+
+
+def extract_source(digest, cache_dir=None):
+    """Fichiers à interroger pour un extrait chargé : son instantané Parquet, s'il existe encore."""
+    path = snapshot_path(digest, cache_dir)
+    return (str(path),) if path.exists() else None
+
+
+def store_source(years=None, offices=None, root=None):
+    """Fichiers des partitions de l'historique pour les années et bureaux demandés."""
+    years = None if years is None else {store._label(y) for y in years}
+    offices = None if offices is None else {store._label(o) for o in offices}
+    paths = tuple(
+        str(path) for (year, office), path in sorted(store.partitions(root).items())
+        if (years is None or year in years) and (offices is None or office in offices)
+    )
+    return paths or None
+
+
+def _ident(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _from(source):
+    files = ", ".join("'" + path.replace("'", "''") + "'" for path in source)
+    return f"read_parquet([{files}], union_by_name = true)"
+
+
+def _plain(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _where(selections, dated=False):
+    """Clause WHERE des sélections (une liste vide ne filtre pas) et ses paramètres."""
+    clauses, params = [], []
+    for column, values in selections:
+        if not len(values):
+            continue
+        clauses.append(f"list_contains(?, {_ident(column)})")
+        params.append([_plain(v) for v in values])
+    if dated:
+        clauses.append('"Date" IS NOT NULL')
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _run(sql, params):
+    import duckdb
+
+    try:
+        with duckdb.connect() as connection:
+            return connection.execute(sql, params).df()
+    except (duckdb.Error, OSError) as exc:
+        raise QueryError(str(exc)) from exc
+
+
+def _number(value, default=math.nan):
+    return default if value is None or pd.isna(value) else float(value)
+
+
+def kpis(source, selections, percentiles=True):
+    """Tous les indicateurs du tableau de bord, au format de ``metrics.compute_kpis``.
+
+    L'OVERVIEW porte sur toutes les lignes retenues, le reste sur les lignes datées. Sans
+    ``percentiles``, les centiles des durées (l'essentiel du coût de la requête) valent NaN.
+    """
+    select = ["count(*) AS lignes"]
+    select += [f"count(DISTINCT {_ident(col)}) AS {_ident('o|' + col)}" for _, col in OVERVIEW_COUNTS]
+    select += [f"sum({_ident(col)}) AS {_ident('t|' + col)}" for _, col in QUANTITY_TOTALS]
+    where, params = _where(selections)
+    row = _run(f"SELECT {', '.join(select)} FROM {_from(source)}{where}", params).iloc[0]
+
+    # Lignes datées dans la clause WHERE plutôt qu'en FILTER sur chaque agrégat, bien plus coûteux
+    quantiles = ", ".join(str(q) for q in PERCENTILES.values())
+    select = []
+    for col in DURATION_COLUMNS + AGING_COLUMNS:
+        c = _ident(col)
+        select += [
+            f"count({c}) AS {_ident('n|' + col)}",
+            f"sum({c}) AS {_ident('s|' + col)}",
+            f"avg({c}) AS {_ident('m|' + col)}",
+            f"stddev_samp({c}) AS {_ident('e|' + col)}",
+            f"max({c}) AS {_ident('x|' + col)}",
+        ]
+        if percentiles:
+            # Les durées float32 seraient interpolées en float32 : calcul en DOUBLE, comme pandas
+            select.append(f"quantile_cont(CAST({c} AS DOUBLE), [{quantiles}]) AS {_ident('q|' + col)}")
+    where, params = _where(selections, dated=True)
+    dated = _run(f"SELECT {', '.join(select)} FROM {_from(source)}{where}", params).iloc[0]
+
+    durations = {}
+    for col in DURATION_COLUMNS + AGING_COLUMNS:
+        n = int(dated['n|' + col])
+        quantile_values = dated['q|' + col] if n and percentiles else None
+        durations[col] = dict(zip(STAT_COLUMNS, [
+            n, _number(dated['s|' + col], 0.0), _number(dated['m|' + col]), _number(dated['e|' + col]),
+            _number(dated['x|' + col]),
+            *(list(map(float, quantile_values)) if quantile_values is not None else [math.nan] * len(PERCENTILES)),
+        ]))
+    return {
+        "lignes": int(row['lignes']),
+        "overview": {label: int(row['o|' + col]) for label, col in OVERVIEW_COUNTS},
+        "totaux": {label: _number(row['t|' + col], 0.0) for label, col in QUANTITY_TOTALS},
+        "seuils": threshold_counts(source, selections),
+        "durees": {col: durations[col] for col in DURATION_COLUMNS},
+        "ages": {col: durations[col]['Moyenne'] for col in AGING_COLUMNS},
+    }
+
+
+def threshold_counts(source, selections):
+    """Occurrences de chaque valeur des seuils sur les lignes datées, en une requête."""
+    where, params = _where(selections, dated=True)
+    parts = [
+        f"SELECT '{col}' AS seuil, CAST({_ident(col)} AS VARCHAR) AS valeur, count(*) AS nombre "
+        f"FROM filtrees WHERE {_ident(col)} IS NOT NULL GROUP BY ALL"
+        for col in THRESHOLD_COLUMNS
+    ]
+    sql = f"WITH filtrees AS (SELECT * FROM {_from(source)}{where}) " + " UNION ALL ".join(parts)
+    counts = _run(sql, params).sort_values(['seuil', 'nombre', 'valeur'], ascending=[True, False, True])
+    return {
+        col: {row.valeur: int(row.nombre) for row in counts[counts['seuil'] == col].itertuples()}
+        for col in THRESHOLD_COLUMNS
+    }
+
+
+def monthly_totals(source, selections, columns):
+    """Comme ``charts.monthly_totals``, sur les lignes datées retenues."""
+    where, params = _where(selections, dated=True)
+    sums = ", ".join(f"sum({_ident(col)}) AS {_ident(col)}" for col in columns)
+    return _run(f'SELECT "Date", {sums} FROM {_from(source)}{where} GROUP BY "Date" ORDER BY "Date"', params)
+
+
+def performance_summary(source, selections, value_column, group_column, top_n=TOP_N_PEOPLE):
+    """Comme ``charts.performance_summary``, sur les lignes datées retenues."""
+    where, params = _where(selections, dated=True)
+    value, group = _ident(value_column), _ident(group_column)
+    centiles = ", ".join(f"quantile_cont(CAST({value} AS DOUBLE), {q}) AS {name}" for name, q in PERCENTILES.items())
+    sql = (
+        f"SELECT {group}, count({value}) AS Nombre, avg({value}) AS Moyenne, max({value}) AS Max, {centiles} "
+        f"FROM {_from(source)}{where} AND {group} IS NOT NULL GROUP BY {group} HAVING count({value}) > 0 "
+        f"ORDER BY Nombre DESC, {group} LIMIT {int(top_n)}"
+    )
+    return _run(sql, params).sort_values('Moyenne', kind='stable').reset_index(drop=True)
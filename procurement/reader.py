@@ -0,0 +1,198 @@
+"""Lecture des extraits PeopleSoft à mémoire bornée.
+
+Le format est reconnu d'après le contenu (signature du fichier), puis l'extension.
+Seules les colonnes du schéma (``REQUIRED_COLUMNS``) sont lues. Les CSV sont lus
+par blocs de ``CHUNK_ROWS`` lignes, et les classeurs xlsx sont parcourus ligne
+à ligne avec openpyxl en lecture seule, ou lus par calamine quand
+``python-calamine`` est installé. Chaque bloc est compacté (libellés en
+catégories) avant d'être assemblé, ce qui évite de garder en mémoire le tableau
+complet d'objets Python. Quand plusieurs fichiers ou feuilles sont fournis, ils
+sont lus en parallèle dans un pool de processus.
+"""
+import importlib.util
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from procurement.schema import CATEGORICAL_COLUMNS, REQUIRED_COLUMNS
+
+# Nombre de lignes converties à la fois
+CHUNK_ROWS = int(os.environ.get("PROCUREMENT_READER_CHUNK_ROWS", "50000"))
+
+# Processus de lecture quand plusieurs fichiers ou feuilles sont fournis
+READER_WORKERS = int(os.environ.get("PROCUREMENT_READER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Moteur rapide pour Excel, utilisé s'il est installé
+CALAMINE = importlib.util.find_spec("python_calamine") is not None
+
+# Textes lus comme valeurs manquantes, comme le fait pandas par défaut
+NA_STRINGS = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+}
+
+_WANTED = set(REQUIRED_COLUMNS)
+
+
+def _wanted(column):
+    return column in _WANTED
+
+
+def detect_format(data, filename=""):
+    """Retourne 'xlsx', 'xls', 'parquet' ou 'csv' d'après la signature du contenu, puis l'extension."""
+    if data[:4] == b"PK\x03\x04":
+        return "xlsx"
+    if data[:8] == b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1":
+        return "xls"
+    if data[:4] == b"PAR1":
+        return "parquet"
+    suffix = Path(str(filename)).suffix.lower().lstrip(".")
+    return suffix if suffix in ("xlsx", "xls", "parquet") else "csv"
+
+
+def _compact(chunk, parse_numbers=False):
+    """Compacte un bloc : valeurs manquantes textuelles, nombres écrits en texte, libellés en catégories.
+
+    ``parse_numbers`` convertit les colonnes texte entièrement numériques, comme
+    le fait ``pd.read_excel`` ; la lecture ligne à ligne doit le faire elle-même.
+    """
+    for col in chunk.columns[chunk.dtypes == object]:
+        chunk[col] = chunk[col].mask(chunk[col].isin(NA_STRINGS))
+        if parse_numbers:
+            try:
+                chunk[col] = pd.to_numeric(chunk[col])
+                continue
+            except (ValueError, TypeError):
+                pass
+        if col in CATEGORICAL_COLUMNS:
+            chunk[col] = chunk[col].astype("category")
+    return chunk
+
+
+def _concat(frames):
+    """Assemble des blocs compactés en conservant les catégories communes."""
+    frames = [frame for frame in frames if len(frame.columns)]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    columns = {}
+    for col in dict.fromkeys(col for frame in frames for col in frame.columns):
+        parts = [frame[col] if col in frame.columns else pd.Series(index=frame.index, dtype=object) for frame in frames]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            try:
+                columns[col] = pd.Series(union_categoricals(parts, ignore_order=True))
+                continue
+            except TypeError:
+                # Catégories de types différents d'un bloc à l'autre : assemblage en objets
+                parts = [part.astype(object) for part in parts]
+        columns[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def _read_csv(data):
+    chunks = pd.read_csv(io.BytesIO(data), usecols=_wanted, chunksize=CHUNK_ROWS)
+    return _concat([_compact(chunk) for chunk in chunks])
+
+
+def _read_xlsx_rows(data, sheet):
+    """Parcourt une feuille xlsx ligne à ligne (openpyxl en lecture seule), bloc par bloc."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True, keep_links=False)
+    try:
+        rows = workbook[sheet].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        positions = [i for i, name in enumerate(header) if _wanted(name)]
+        names = [header[i] for i in positions]
+        chunks, buffer = [], []
+        for row in rows:
+            values = tuple(row[i] if i < len(row) else None for i in positions)
+            # Lignes vides ignorées, comme pd.read_excel
+            if all(value is None for value in values):
+                continue
+            buffer.append(values)
+            if len(buffer) >= CHUNK_ROWS:
+                chunks.append(_compact(pd.DataFrame.from_records(buffer, columns=names), parse_numbers=True))
+                buffer = []
+        if buffer or not chunks:
+            chunks.append(_compact(pd.DataFrame.from_records(buffer, columns=names), parse_numbers=True))
+        return _concat(chunks)
+    finally:
+        workbook.close()
+
+
+def _read_sheet(data, fmt, sheet):
+    if fmt == "xlsx" and not CALAMINE:
+        return _read_xlsx_rows(data, sheet)
+    engine = "calamine" if CALAMINE else None
+    return _compact(pd.read_excel(io.BytesIO(data), sheet_name=sheet, usecols=_wanted, engine=engine))
+
+
+def _read_parquet(data):
+    import pyarrow.parquet as pq
+
+    columns = [name for name in pq.read_schema(io.BytesIO(data)).names if _wanted(name)]
+    return pd.read_parquet(io.BytesIO(data), columns=columns)
+
+
+def _sheet_names(data, fmt):
+    if fmt == "xlsx" and not CALAMINE:
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True)
+        try:
+            return workbook.sheetnames
+        finally:
+            workbook.close()
+    with pd.ExcelFile(io.BytesIO(data), engine="calamine" if CALAMINE else None) as book:
+        return book.sheet_names
+
+
+def _read_part(data, fmt, sheet=None):
+    """Lit une feuille d'un classeur, ou un fichier entier pour les autres formats."""
+    if fmt == "csv":
+        return _read_csv(data)
+    if fmt == "parquet":
+        return _read_parquet(data)
+    return _read_sheet(data, fmt, sheet)
+
+
+def read_extracts(files, workers=None):
+    """Lit un ou plusieurs extraits ``(contenu, nom de fichier)`` et les assemble en un seul tableau.
+
+    Toutes les feuilles des classeurs sont lues, mais seules celles qui portent
+    toutes les colonnes du schéma sont assemblées : une feuille de synthèse ou de
+    notes qui reprend quelques en-têtes n'ajoute pas de lignes. Si aucune feuille
+    n'est complète, seule la première est gardée, et la validation du schéma
+    signale les colonnes manquantes.
+    """
+    parts, files_parts = [], []
+    for data, filename in files:
+        fmt = detect_format(data, filename)
+        sheets = _sheet_names(data, fmt) if fmt in ("xlsx", "xls") else [None]
+        files_parts.append((len(parts), len(parts) + len(sheets)))
+        parts += [(data, fmt, sheet) for sheet in sheets]
+    workers = min(READER_WORKERS if workers is None else workers, len(parts))
+    if workers <= 1:
+        frames = [_read_part(*part) for part in parts]
+    else:
+        # spawn : pas de fork d'un serveur Streamlit multithreadé
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            frames = list(pool.map(_read_part, *zip(*parts)))
+    kept = []
+    for start, stop in files_parts:
+        sheets = frames[start:stop]
+        complete = [frame for frame in sheets if _WANTED.issubset(frame.columns)]
+        kept += complete or sheets[:1]
+    return _concat(kept)
+
+
+def read_extract(data, filename):
+    """Lit le contenu brut d'un extrait PeopleSoft, quel que soit son format."""
+    return read_extracts([(data, filename)])
@@ -0,0 +1,209 @@
+"""Rapports HTML hors ligne, un par bureau ou par code de fonds.
+
+Chaque rapport reprend les indicateurs (``metrics.compute_kpis``) et les
+graphiques (``charts``) du tableau de bord pour une sélection, dans un seul
+fichier HTML autonome : plotly.js y est inclus, le rapport s'ouvre sans
+connexion.
+
+L'extrait n'est analysé qu'une fois. Les rapports sont ensuite rendus en
+parallèle dans un pool de processus : chaque processus relit une seule fois
+l'instantané Parquet de l'extrait et construit son index des filtres, puis
+rend les rapports qui lui sont confiés.
+
+Instantané hebdomadaire, un rapport par bureau de ``DEPT_MAPPING`` plus la vue complète :
+
+    python -m procurement.report extrait.xlsx --all-offices
+"""
+import argparse
+import html
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+from plotly.offline import get_plotlyjs
+
+from procurement.batch import selections_for
+from procurement.charts import (
+    PERFORMANCE_CHARTS, duration_means_figure, duration_totals_figure, monthly_totals, performance_figure,
+    quantity_figures, threshold_figure,
+)
+from procurement.filters import FilterIndex
+from procurement.ingest import DEPT_MAPPING, load_extract, snapshot_path
+from procurement.metrics import THRESHOLD_COLUMNS, compute_kpis, durations_frame
+
+# Répertoire des rapports, configurable par variable d'environnement
+REPORTS_DIR = Path(os.environ.get("PROCUREMENT_REPORTS_DIR", "reports"))
+
+# Processus de rendu ; au-delà du nombre de cœurs, les rapports attendent leur tour
+REPORT_WORKERS = int(os.environ.get("PROCUREMENT_REPORT_WORKERS", str(os.cpu_count() or 1)))
+
+_STYLE = """
+body { font-family: sans-serif; margin: 2em; }
+.ligne { display: flex; gap: 1em; flex-wrap: wrap; margin-bottom: 1em; }
+.metrique { background-color: orange; border: 2px solid green; border-radius: 10px; padding: 15px;
+            text-align: center; font-weight: bold; color: white; font-size: 15px; min-width: 10em; }
+.valeur { font-size: 30px; }
+.graphiques { display: flex; flex-wrap: wrap; }
+.graphique { flex: 1 1 45%; min-width: 30em; }
+table { border-collapse: collapse; }
+td, th { border: 1px solid #ccc; padding: 4px 8px; text-align: right; }
+"""
+
+# Extrait chargé une fois par processus de rendu : (tableau, index des filtres)
+_dataset = None
+
+
+def _number(value, prefix="", suffix=""):
+    if pd.isna(value):
+        return "-"
+    return f"{prefix}{int(value):,}{suffix}".replace(",", " ")
+
+
+def _metrics(items):
+    cells = "".join(
+        f"<div class='metrique'><div class='valeur'>{html.escape(str(value))}</div>"
+        f"<div>{html.escape(label)}</div></div>"
+        for label, value in items
+    )
+    return f"<div class='ligne'>{cells}</div>"
+
+
+def _figures(figures):
+    cells = "".join(
+        f"<div class='graphique'>{f'<h4>{html.escape(title)}</h4>' if title else ''}"
+        f"{fig.to_html(full_html=False, include_plotlyjs=False)}</div>"
+        for fig, title in figures
+    )
+    return f"<div class='graphiques'>{cells}</div>"
+
+
+def render_report(df, title):
+    """Page HTML autonome des indicateurs et graphiques du tableau de bord pour un extrait filtré."""
+    kpis = compute_kpis(df)
+    parts = [f"<h1>{html.escape(title)}</h1>",
+             f"<p>{kpis['lignes']} lignes, rapport du {pd.Timestamp.now():%d/%m/%Y %H:%M}</p>"]
+    if kpis['lignes']:
+        # Comme dans l'interface : OVERVIEW sur toutes les lignes, le reste sur les lignes datées
+        dated = df.dropna(subset=['Date'])
+        stats = durations_frame(kpis)
+        totaux = kpis['totaux']
+        parts += [
+            "<h2>OVERVIEW</h2>",
+            _metrics(kpis['overview'].items()),
+            _metrics([(label, _number(value, "$" if label == "Valeurs engagées" else ""))
+                      for label, value in totaux.items()]),
+            "<h2>Quantités par mois</h2>",
+            _figures((fig, "") for fig in quantity_figures(
+                monthly_totals(dated, ['Quantity Ordered', 'Quantity Received']))),
+            "<h2>Seuil d'approbation des PO</h2>",
+            _figures((threshold_figure(pd.Series(kpis['seuils'][col], name='count', dtype='int64').rename_axis(col),
+                                       col), "") for col in THRESHOLD_COLUMNS),
+            "<h2>Durées des phases d'approbation</h2>",
+            stats.round(1).to_html(na_rep="-"),
+            _figures([(duration_means_figure(stats), "Moyenne des Durées de jours"),
+                      (duration_totals_figure(stats), "Total des Durées de jours")]),
+            "<h2>MOYENNE D'AGE</h2>",
+            _metrics((f"Moyenne Age {col.split()[0]}", _number(value, suffix=" Jour.s"))
+                     for col, value in kpis['ages'].items()),
+        ]
+        for rubrique, graphiques in PERFORMANCE_CHARTS:
+            parts += [f"<h2>{html.escape(rubrique)}</h2>", _figures(
+                (performance_figure(dated[[value, person]], value, person), chart_title)
+                for value, person, chart_title in graphiques
+            )]
+    return (
+        f"<!DOCTYPE html><html lang='fr'><head><meta charset='utf-8'><title>{html.escape(title)}</title>"
+        f"<style>{_STYLE}</style><script type='text/javascript'>{get_plotlyjs()}</script></head>"
+        f"<body>{''.join(parts)}</body></html>"
+    )
+
+
+def _slug(label):
+    return re.sub(r"[^\w.-]+", "_", label).strip("_") or "rapport"
+
+
+def report_jobs(index, offices=(), fund_codes=(), all_offices=False, all_funds=False):
+    """Rapports à produire : ``(libellé, bureaux, codes de fonds)``, la sélection demandée en premier."""
+    jobs = [(" ".join(list(offices) + list(fund_codes)) or "complet", list(offices), list(fund_codes))]
+    if all_offices:
+        present = set(index.all_options('Dept ID'))
+        jobs += [(office, [office], list(fund_codes)) for office in DEPT_MAPPING.values() if office in present]
+    if all_funds:
+        jobs += [(str(code), list(offices), [str(code)]) for code in index.all_options('Fund Code')]
+    return jobs
+
+
+def _render_job(job, years, output):
+    df, index = _dataset
+    label, offices, fund_codes = job
+    selections = selections_for(index, offices, fund_codes, years)
+    title = f"Rapport achats : {label}" + (f" ({', '.join(map(str, years))})" if years else "")
+    path = Path(output) / f"rapport_{_slug(label)}.html"
+    path.write_text(render_report(index.apply(df, selections), title), encoding='utf-8')
+    return path
+
+
+def _load_dataset(snapshot):
+    global _dataset
+    df = pd.read_parquet(snapshot)
+    _dataset = (df, FilterIndex(df))
+
+
+def run(path, offices=(), fund_codes=(), years=(), all_offices=False, all_funds=False, output=None, workers=None):
+    """Rend et enregistre les rapports ; retourne la liste des fichiers écrits."""
+    global _dataset
+    path = Path(path)
+    output = Path(output or REPORTS_DIR)
+    output.mkdir(parents=True, exist_ok=True)
+    digest, df = load_extract(path.read_bytes(), path.name)
+    index = FilterIndex(df)
+    jobs = report_jobs(index, offices, fund_codes, all_offices, all_funds)
+    workers = min(REPORT_WORKERS if workers is None else workers, len(jobs))
+    if workers <= 1:
+        _dataset = (df, index)
+        try:
+            return [_render_job(job, years, output) for job in jobs]
+        finally:
+            _dataset = None
+    # spawn, comme pour la lecture : chaque processus relit l'instantané déjà analysé, pas le fichier source
+    del df, index
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_load_dataset, initargs=(str(snapshot_path(digest)),)) as pool:
+        return list(pool.map(_render_job, jobs, [years] * len(jobs), [output] * len(jobs)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m procurement.report",
+        description="Rend un rapport HTML hors ligne par bureau ou par code de fonds à partir d'un extrait PeopleSoft.",
+    )
+    parser.add_argument("extract", help="extrait PeopleSoft (xlsx, xls ou csv)")
+    parser.add_argument("--office", action="append", default=[], help="bureau (ex. Goma), répétable")
+    parser.add_argument("--fund-code", action="append", default=[], help="code de fonds, répétable")
+    parser.add_argument("--year", action="append", default=[], help="année PR, répétable")
+    parser.add_argument("--all-offices", action="store_true", help="un rapport par bureau de DEPT_MAPPING")
+    parser.add_argument("--all-funds", action="store_true", help="un rapport par code de fonds de l'extrait")
+    parser.add_argument("--output", default=None, help=f"répertoire de sortie (défaut : {REPORTS_DIR})")
+    parser.add_argument("--workers", type=int, default=None, help=f"processus de rendu (défaut : {REPORT_WORKERS})")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        written = run(args.extract, args.office, args.fund_code, args.year,
+                      args.all_offices, args.all_funds, args.output, args.workers)
+    except (OSError, ValueError) as exc:
+        print(f"Erreur : {exc}", file=sys.stderr)
+        return 1
+    for path in written:
+        print(path)
+    print(f"{len(written)} rapports en {time.perf_counter() - start:.1f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Schéma déclaré de l'extrait PeopleSoft.
+
+Le schéma est validé une seule fois au chargement, avant l'instantané Parquet :
+les libellés répétés deviennent des catégories, les nombres de jours et les
+quantités sont réduits au plus petit type exact, et les colonnes dérivées
+``Date`` et ``Balance`` sont calculées une fois pour toutes.
+"""
+import numpy as np
+import pandas as pd
+
+# Colonnes de libellés répétés, stockées en catégories
+CATEGORICAL_COLUMNS = [
+    'Dept ID', 'Fund Code', 'Project ID', 'PO Buyer', 'PR Status', 'PO Status', 'Currency',
+    'Threshold 1', 'Threshold 2', 'Threshold 3',
+    'Vch Last Approver', 'PO Last Approver', 'Vch Data Entered By', 'Rcpt Data Entered By',
+]
+
+# Durées des phases d'approbation (en jours)
+DURATION_COLUMNS = [
+    'PR-RFQ Entry Dt', 'PR-PO EDt', 'PO-RC EDt', 'RC-VCH EDt', 'VCH-PY EDt',
+    'VCH/Inv Tran Dt to PY Entry Dt', 'PR-RC EDt', 'PR-Invoice/VCH Trans Date',
+    'PR-VCH EDt', 'PR-PY EDt', 'PO-VCH EDt', 'PO-PY EDt', 'PR TotApprv T',
+    'PO TotApprv T', 'VCH TotApprv T'
+]
+
+# Durées utilisées par les graphiques de performances
+PERFORMANCE_COLUMNS = [
+    'PR Appr-RFQ Entry Dt', 'PR Appr-RC EDt', 'PR Appr-PO EDt', 'PO Appr-RC EDt', 'VCH Appr-PY EDt',
+]
+
+# Âge des pièces (en jours)
+AGING_COLUMNS = ['PR Aging', 'PO Aging', 'RC Aging', 'VCH Aging']
+
+DAY_COUNT_COLUMNS = DURATION_COLUMNS + PERFORMANCE_COLUMNS + AGING_COLUMNS
+
+QUANTITY_COLUMNS = ['Quantity Ordered', 'Quantity Received', 'Balance Pending to be Rcvd']
+
+# Identifiants des pièces, laissés tels quels
+ID_COLUMNS = ['Requisition ID', 'PR Item', 'RFQ ID', 'PO No.', 'Receipt Nbr', 'Voucher ID', 'Vch Pymt Ref']
+
+REQUIRED_COLUMNS = (
+    ID_COLUMNS + CATEGORICAL_COLUMNS + DAY_COUNT_COLUMNS + QUANTITY_COLUMNS
+    + ['PR-Year', 'PR-Month', 'Item Total']
+)
+
+
+def validate_columns(df):
+    """Lève ``ValueError`` si des colonnes attendues par le tableau de bord manquent."""
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError("Colonnes manquantes dans l'extrait : " + ", ".join(missing))
+
+
+def _downcast(series):
+    """Réduit une colonne numérique au plus petit type qui conserve les valeurs exactes."""
+    series = pd.to_numeric(series, errors='coerce')
+    values = series.to_numpy(dtype='float64')
+    finite = values[~np.isnan(values)]
+    if finite.size and not np.array_equal(finite, np.round(finite)):
+        return series
+    if series.isna().any():
+        # Entiers avec valeurs manquantes : float32 est exact jusqu'à 2**24
+        if not finite.size or np.abs(finite).max() < 2 ** 24:
+            return series.astype('float32')
+        return series
+    return pd.to_numeric(series, downcast='integer')
+
+
+def convert_types(df):
+    """Convertit les colonnes au schéma compact : catégories et types numériques réduits."""
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS or (
+            df[col].dtype == object and (col.endswith('Entered By') or col.endswith('Approver'))
+        ):
+            df[col] = df[col].astype('category')
+    for col in DAY_COUNT_COLUMNS:
+        df[col] = _downcast(df[col])
+    # Les quantités sont sommées : on ne les réduit que si elles restent entières
+    for col in QUANTITY_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+        if df[col].notna().all() and (df[col] == df[col].round()).all():
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    df['Item Total'] = pd.to_numeric(df['Item Total'], errors='coerce')
+    return df
+
+
+def derive_columns(df):
+    """Construit une seule fois, de façon vectorisée, les colonnes 'Date' et 'Balance'."""
+    year = pd.to_numeric(df['PR-Year'], errors='coerce')
+    month = pd.to_numeric(df['PR-Month'], errors='coerce')
+    df['Date'] = pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': 1}), errors='coerce')
+    df['PR-Year'] = _downcast(year)
+    df['PR-Month'] = _downcast(month)
+    df['Balance'] = df['Quantity Ordered'] - df['Quantity Received']
+    return df
+
+
+def apply_schema(df):
+    """Valide l'extrait et le convertit au schéma compact. Retourne le DataFrame converti."""
+    validate_columns(df)
+    return derive_columns(convert_types(df))
@@ -0,0 +1,175 @@
+"""Cache des extraits partagé par toutes les sessions du processus.
+
+Plusieurs agents chargent souvent le même extrait hebdomadaire en même temps.
+Chaque extrait analysé, avec ses index de filtres et d'identifiants et son cube, n'est
+gardé qu'une fois par processus, sous l'empreinte de son contenu. Les sessions
+lisent le même tableau, en lecture seule, et n'en gardent que des masques. Au-delà
+de ``SHARED_CACHE_MB``, les extraits les moins récemment utilisés sont retirés.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from procurement.cube import Cube
+from procurement.filters import FilterIndex
+from procurement.id_index import ID_SEARCH_COLUMNS, IdIndex
+from procurement.metrics import DistinctCounts
+
+# Plafond mémoire du cache (en Mo), configurable par variable d'environnement
+SHARED_CACHE_MB = float(os.environ.get("PROCUREMENT_SHARED_CACHE_MB", "4096"))
+
+
+def frame_nbytes(df):
+    """Mémoire occupée par un tableau, chaînes comprises."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class SharedDataset:
+    """Extrait analysé et index dérivés, construits une fois et partagés entre les sessions."""
+
+    def __init__(self, df):
+        self.df = df
+        dates = df['Date'].notna().to_numpy() if 'Date' in df.columns else None
+        # Lignes datées ; None quand elles le sont toutes
+        self.dated = None if dates is None or dates.all() else dates
+        self._lock = threading.Lock()
+        self._index = None
+        self._ids = None
+        self._cube = False
+        self._distinct = None
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = FilterIndex(self.df)
+            return self._index
+
+    @property
+    def ids(self):
+        index = self.index
+        with self._lock:
+            if self._ids is None:
+                self._ids = {col: IdIndex.from_filter_index(index, col) for col in ID_SEARCH_COLUMNS}
+            return self._ids
+
+    @property
+    def distinct(self):
+        """Comptes distincts de l'OVERVIEW sur codes factorisés."""
+        index = self.index
+        with self._lock:
+            if self._distinct is None:
+                self._distinct = DistinctCounts(self.df, index)
+            return self._distinct
+
+    @property
+    def cube(self):
+        """Cube des indicateurs, ou ``None`` s'il ne résume pas assez l'extrait."""
+        with self._lock:
+            if self._cube is False:
+                self._cube = Cube.build(self.df)
+            return self._cube
+
+    def nbytes(self):
+        total = frame_nbytes(self.df) + (self.dated.nbytes if self.dated is not None else 0)
+        if self._index is not None:
+            total += self._index.nbytes()
+        if self._ids is not None:
+            total += sum(ids.nbytes() for ids in self._ids.values())
+        if self._cube:
+            total += self._cube.nbytes()
+        if self._distinct is not None:
+            # Les codes partagés avec l'index des filtres sont comptés deux fois : estimation haute
+            total += self._distinct.nbytes()
+        return total
+
+
+def _nbytes(value):
+    if hasattr(value, "nbytes"):
+        return value.nbytes() if callable(value.nbytes) else int(value.nbytes)
+    return frame_nbytes(value)
+
+
+class SharedCache:
+    """Cache LRU, sûr entre threads, plafonné en mémoire.
+
+    Quand plusieurs sessions demandent en même temps la même clé absente, une
+    seule la charge ; les autres attendent puis réutilisent le résultat.
+    """
+
+    def __init__(self, max_mb=None):
+        self.max_bytes = (SHARED_CACHE_MB if max_mb is None else max_mb) * 2 ** 20
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """Retourne la valeur de ``key``, chargée par ``loader()`` si elle est absente.
+
+        Un ``loader()`` qui retourne ``None`` n'est pas mis en cache : il sera rappelé la prochaine fois.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    # Chargée entre-temps par une autre session
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+                self.misses += 1
+            try:
+                value = loader()
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+            if value is None:
+                return None
+            with self._lock:
+                self._entries[key] = value
+                self._evict(keep=key)
+            return value
+
+    def _evict(self, keep):
+        # Les index construits après coup grossissent les entrées : la taille est relue à chaque éviction
+        sizes = {key: _nbytes(value) for key, value in self._entries.items()}
+        total = sum(sizes.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= sizes[key]
+            del self._entries[key]
+            self.evictions += 1
+
+    def stats(self):
+        """Succès, défauts, évictions, nombre d'entrées et mémoire occupée (en Mo)."""
+        with self._lock:
+            used = sum(_nbytes(value) for value in self._entries.values())
+            return {
+                "succes": self.hits, "defauts": self.misses, "evictions": self.evictions,
+                "entrees": len(self._entries), "mo": round(used / 2 ** 20, 1),
+                "plafond_mo": round(self.max_bytes / 2 ** 20, 1),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def combine_masks(*masks):
+    """Conjonction de masques booléens ; ``None`` signifie « toutes les lignes »."""
+    masks = [mask for mask in masks if mask is not None]
+    if not masks:
+        return None
+    return np.logical_and.reduce(masks) if len(masks) > 1 else masks[0]
@@ -0,0 +1,62 @@
+"""Statistiques des durées (en jours) : moyenne, écart-type, total, maximum et centiles.
+
+Les durées PeopleSoft sont des nombres entiers de jours. Chaque colonne est donc
+lue une seule fois pour en construire l'histogramme (``np.bincount``), dont on
+tire ensuite tous les moments et les centiles exacts. Les colonnes non entières
+ou trop étendues passent par un calcul numpy classique.
+"""
+import numpy as np
+import pandas as pd
+
+# Centiles calculés partout (statistiques des durées, graphiques de performances, requêtes)
+PERCENTILES = {'P50': 0.5, 'P90': 0.9, 'P95': 0.95}
+
+STAT_COLUMNS = ['Nombre', 'Somme', 'Moyenne', 'Écart-type', 'Max'] + list(PERCENTILES)
+
+# Étendue maximale (en jours) d'une colonne traitée par histogramme
+HISTOGRAM_MAX_RANGE = 1 << 20
+
+
+def _histogram_stats(values):
+    """Statistiques d'une colonne d'entiers sans NaN, ou ``None`` si l'histogramme ne convient pas."""
+    low = values.min()
+    if values.max() - low >= HISTOGRAM_MAX_RANGE:
+        return None
+    counts = np.bincount(values - low)
+    days = np.arange(low, low + counts.size, dtype='float64')
+    n = values.size
+    total = float(counts @ days)
+    sum_sq = float(counts @ (days * days))
+    std = np.sqrt(max(sum_sq - total * total / n, 0.0) / (n - 1)) if n > 1 else np.nan
+    # Centiles par interpolation linéaire entre rangs, comme pandas.Series.quantile
+    cumulative = np.cumsum(counts)
+    ranks = (n - 1) * np.array(list(PERCENTILES.values()))
+    below = np.floor(ranks).astype('int64')
+    above = np.minimum(below + 1, n - 1)
+    at_below = low + np.searchsorted(cumulative, below, side='right')
+    at_above = low + np.searchsorted(cumulative, above, side='right')
+    percentiles = at_below + (at_above - at_below) * (ranks - below)
+    return [n, total, total / n, std, float(low + counts.size - 1), *percentiles]
+
+
+def _column_stats(values):
+    if values.dtype.kind == 'f':
+        values = values[~np.isnan(values)]
+    n = values.size
+    if n == 0:
+        return [0, 0.0] + [np.nan] * (len(STAT_COLUMNS) - 2)
+    as_int = values.astype('int64')
+    if values.dtype.kind in 'iu' or np.array_equal(as_int, values):
+        stats = _histogram_stats(as_int)
+        if stats is not None:
+            return stats
+    values = values.astype('float64')
+    std = values.std(ddof=1) if n > 1 else np.nan
+    percentiles = np.percentile(values, [100 * q for q in PERCENTILES.values()])
+    return [n, values.sum(), values.mean(), std, values.max(), *percentiles]
+
+
+def duration_stats(df, columns):
+    """Tableau des statistiques de chaque colonne de durée (une ligne par colonne)."""
+    rows = [_column_stats(pd.to_numeric(df[col]).to_numpy()) for col in columns]
+    return pd.DataFrame(rows, index=list(columns), columns=STAT_COLUMNS)
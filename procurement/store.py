@@ -0,0 +1,324 @@
+"""Historique local des extraits PeopleSoft, partitionné par année et par bureau.
+
+Chaque extrait ajouté est comparé au manifeste des lignes déjà connues, clé
+``Requisition ID`` + ``PR Item`` : seules les lignes nouvelles ou modifiées
+(empreinte de contenu différente) sont écrites, et seules les partitions
+touchées sont réécrites. Les partitions sont des fichiers Parquet rangés sous
+``PR-Year=<année>/Dept ID=<bureau>/``, ce qui permet de ne relire que les
+années et bureaux demandés.
+
+Les écritures sont sérialisées par un verrou de fichier sous la racine : les
+sessions du tableau de bord et la commande ``watch`` peuvent ajouter des
+extraits en même temps, chacune attend la fin de l'écriture en cours.
+
+    python -m procurement.store ingest extrait.xlsx
+    python -m procurement.store watch depot/ --interval 300
+    python -m procurement.store info
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from procurement.ingest import content_hash, load_extract
+from procurement.schema import CATEGORICAL_COLUMNS
+
+STORE_DIR = Path(os.environ.get("PROCUREMENT_STORE_DIR", "data/store"))
+
+KEY_COLUMNS = ['Requisition ID', 'PR Item']
+
+_MANIFEST = "_manifest.parquet"
+_VERSION = "_version.json"
+_INGESTED = "_ingested.json"
+_LOCK = "_ingest.lock"
+
+# Les sessions Streamlit sont des threads d'un même processus : verrou local en plus du verrou de fichier
+_write_lock = threading.Lock()
+
+# Libellé de partition des lignes sans année ou sans bureau
+_MISSING = "__NA__"
+
+EXTRACT_SUFFIXES = ('.xlsx', '.xls', '.csv')
+
+
+def _label(value):
+    if pd.isna(value):
+        return _MISSING
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _keys(df):
+    """Clé normalisée en texte, pour comparer des extraits aux types différents."""
+    return pd.DataFrame({
+        '_req': df['Requisition ID'].astype(str).to_numpy(),
+        '_item': df['PR Item'].astype(str).to_numpy(),
+    })
+
+
+def _row_hashes(df):
+    """Empreinte du contenu de chaque ligne, indépendante du type de stockage (5 == 5.0)."""
+    content = {}
+    for col in sorted(df.columns):
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            # Arrondi : le CSV et l'Excel ne relisent pas toujours les décimales au bit près
+            values = values.astype('float64').round(6)
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        content[col] = values
+    return pd.util.hash_pandas_object(pd.DataFrame(content), index=False).to_numpy()
+
+
+def _partition_path(root, year, office):
+    return Path(root) / f"PR-Year={year}" / f"Dept ID={office}" / "data.parquet"
+
+
+def _replace(path, write):
+    """Écrit ``path`` dans un fichier temporaire unique puis le remplace d'un coup.
+
+    Les lecteurs voient l'ancienne ou la nouvelle version, jamais un fichier partiel.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{path.name}.", suffix=".tmp", dir=path.parent)
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
+
+
+def _write_atomic(frame, path):
+    _replace(path, lambda tmp_path: frame.to_parquet(tmp_path, index=False))
+
+
+@contextmanager
+def _locked(root):
+    """Verrou exclusif d'écriture dans l'historique, entre threads et entre processus."""
+    root.mkdir(parents=True, exist_ok=True)
+    with _write_lock, open(root / _LOCK, "a+b") as handle:
+        if os.name == "nt":
+            import msvcrt
+
+            handle.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK abandonne après dix secondes : l'écriture en cours n'est pas finie
+                    continue
+            try:
+                yield
+            finally:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _restore_categories(df):
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and df[col].dtype != 'category':
+            df[col] = df[col].astype('category')
+    return df
+
+
+def version(root=None):
+    """Identifiant de la dernière écriture dans l'historique, ou ``None`` s'il est vide."""
+    path = Path(root or STORE_DIR) / _VERSION
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())["version"]
+
+
+def ingest(df, root=None):
+    """Ajoute un extrait (déjà passé par le schéma) à l'historique.
+
+    Retourne le nombre de lignes nouvelles, modifiées et inchangées, et le
+    nombre de partitions réécrites.
+    """
+    root = Path(root or STORE_DIR)
+    df = df.reset_index(drop=True)
+    keys = _keys(df)
+    keep = ~keys.duplicated(keep='last').to_numpy()
+    df, keys = df[keep].reset_index(drop=True), keys[keep].reset_index(drop=True)
+
+    incoming = keys.assign(
+        _hash=_row_hashes(df),
+        _year=df['PR-Year'].map(_label).to_numpy(dtype=object),
+        _office=df['Dept ID'].astype(object).map(_label).to_numpy(dtype=object),
+    )
+    # Une seule écriture à la fois : lecture du manifeste, partitions et manifeste forment un tout
+    with _locked(root):
+        manifest_path = root / _MANIFEST
+        if manifest_path.exists():
+            manifest = pd.read_parquet(manifest_path)
+        else:
+            manifest = incoming.iloc[:0]
+
+        # Le manifeste est unique par clé : les jointures à gauche gardent l'ordre des lignes entrantes
+        previous = incoming[['_req', '_item']].merge(manifest, on=['_req', '_item'], how='left', indicator=True)
+        known = (previous['_merge'] == 'both').to_numpy()
+        same = incoming[['_req', '_item', '_hash']].merge(
+            manifest[['_req', '_item', '_hash']], on=['_req', '_item', '_hash'], how='left', indicator=True)
+        unchanged = (same['_merge'] == 'both').to_numpy()
+        todo = ~unchanged
+        stats = {
+            "nouvelles": int((~known).sum()),
+            "modifiees": int((known & ~unchanged).sum()),
+            "inchangees": int(unchanged.sum()),
+            "partitions": 0,
+        }
+        if not todo.any():
+            return stats
+
+        changed = incoming[todo]
+        rows = df[todo]
+        changed_keys = pd.MultiIndex.from_frame(changed[['_req', '_item']])
+        # Partitions à réécrire : celles qui reçoivent les lignes et celles qui en contenaient l'ancienne version
+        old = previous[known & todo]
+        touched = set(zip(changed['_year'], changed['_office'])) | set(zip(old['_year'], old['_office']))
+
+        for year, office in sorted(touched):
+            path = _partition_path(root, year, office)
+            parts = []
+            if path.exists():
+                existing = pd.read_parquet(path)
+                stale = pd.MultiIndex.from_frame(_keys(existing)).isin(changed_keys)
+                parts.append(existing[~stale])
+            in_partition = ((changed['_year'] == year) & (changed['_office'] == office)).to_numpy()
+            parts.append(rows[in_partition])
+            parts = [p for p in parts if len(p)]
+            if parts:
+                _write_atomic(pd.concat(parts, ignore_index=True), path)
+            else:
+                path.unlink(missing_ok=True)
+            stats["partitions"] += 1
+
+        kept = manifest[~pd.MultiIndex.from_frame(manifest[['_req', '_item']]).isin(changed_keys)]
+        _write_atomic(pd.concat([kept, changed], ignore_index=True), manifest_path)
+        marker = json.dumps({"version": uuid.uuid4().hex})
+        _replace(root / _VERSION, lambda tmp_path: Path(tmp_path).write_text(marker))
+        return stats
+
+
+def partitions(root=None):
+    """Liste des partitions présentes : couples (année, bureau) -> chemin."""
+    root = Path(root or STORE_DIR)
+    found = {}
+    for path in root.glob("PR-Year=*/Dept ID=*/data.parquet"):
+        year = path.parent.parent.name.split("=", 1)[1]
+        office = path.parent.name.split("=", 1)[1]
+        found[(year, office)] = path
+    return found
+
+
+def load(years=None, offices=None, columns=None, root=None):
+    """Relit l'historique en ne lisant que les partitions des années et bureaux demandés."""
+    years = None if years is None else {_label(y) for y in years}
+    offices = None if offices is None else {_label(o) for o in offices}
+    frames = [
+        pd.read_parquet(path, columns=columns)
+        for (year, office), path in sorted(partitions(root).items())
+        if (years is None or year in years) and (offices is None or office in offices)
+    ]
+    if not frames:
+        return None
+    return _restore_categories(pd.concat(frames, ignore_index=True))
+
+
+def ingest_file(path, root=None):
+    """Analyse un fichier d'extrait puis l'ajoute à l'historique."""
+    path = Path(path)
+    _, df = load_extract(path.read_bytes(), path.name)
+    return ingest(df, root)
+
+
+def watch(folder, root=None, interval=60, once=False):
+    """Surveille un dossier de dépôt et ajoute à l'historique chaque nouvel extrait.
+
+    Un fichier illisible ou mal formé est signalé puis ignoré jusqu'à sa prochaine modification ;
+    la surveillance continue.
+    """
+    root = Path(root or STORE_DIR)
+    log_path = root / _INGESTED
+    ingested = set(json.loads(log_path.read_text())) if log_path.exists() else set()
+    seen = {}
+    while True:
+        for path in sorted(Path(folder).iterdir()):
+            if path.suffix.lower() not in EXTRACT_SUFFIXES:
+                continue
+            try:
+                stat = path.stat()
+                signature = (stat.st_size, stat.st_mtime)
+                if seen.get(path) == signature:
+                    continue
+                seen[path] = signature
+                data = path.read_bytes()
+                digest = content_hash(data)
+                if digest in ingested:
+                    continue
+                _, df = load_extract(data, path.name, digest=digest)
+            except Exception as exc:
+                # Fichier retiré, tronqué pendant la copie ou mal formé : chaque lecteur (zip, openpyxl,
+                # xlrd, pandas) lève sa propre exception, aucune ne doit arrêter la surveillance
+                print(f"Erreur : {path.name} : {exc!r}", file=sys.stderr, flush=True)
+                continue
+            print(path.name, ingest(df, root), flush=True)
+            ingested.add(digest)
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            log_path.write_text(json.dumps(sorted(ingested)))
+        if once:
+            return
+        time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m procurement.store",
+                                     description="Historique partitionné des extraits PeopleSoft.")
+    parser.add_argument("--root", default=None, help=f"répertoire de l'historique (défaut : {STORE_DIR})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = commands.add_parser("ingest", help="ajoute un ou plusieurs extraits")
+    ingest_parser.add_argument("extracts", nargs="+")
+    watch_parser = commands.add_parser("watch", help="surveille un dossier de dépôt")
+    watch_parser.add_argument("folder")
+    watch_parser.add_argument("--interval", type=float, default=60, help="secondes entre deux passages")
+    watch_parser.add_argument("--once", action="store_true", help="un seul passage puis arrêt")
+    commands.add_parser("info", help="liste les partitions")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "ingest":
+            for path in args.extracts:
+                print(path, ingest_file(path, args.root))
+        elif args.command == "watch":
+            watch(args.folder, args.root, args.interval, args.once)
+        else:
+            for (year, office), path in sorted(partitions(args.root).items()):
+                print(year, office, path.stat().st_size)
+    except (OSError, ValueError) as exc:
+        print(f"Erreur : {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Générateur d'extraits PeopleSoft synthétiques, pour les mesures de performance.
+
+Produit exactement les colonnes lues par le tableau de bord (``REQUIRED_COLUMNS``),
+avec des cardinalités proches des extraits réels : identifiants de pièces,
+codes ``CD00xx`` (plus quelques codes hors ``DEPT_MAPPING``), statuts, seuils,
+quantités, les 15 durées de phases (avec valeurs manquantes) et les âges.
+
+    python -m procurement.synthetic 100000 extrait.csv
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from procurement.ingest import DEPT_MAPPING
+from procurement.schema import DAY_COUNT_COLUMNS, REQUIRED_COLUMNS
+
+# Limite de lignes d'une feuille Excel (en-tête compris)
+EXCEL_MAX_ROWS = 1_048_575
+
+PR_STATUSES = ['Approved', 'Pending', 'Complete', 'Canceled', 'Denied']
+PO_STATUSES = ['Dispatched', 'Approved', 'Complete', 'Pending Approval', 'Canceled']
+CURRENCIES = ['USD', 'CDF', 'EUR']
+
+
+def _ids(rng, n, distinct, prefix="", width=10):
+    """Identifiants texte à zéros non significatifs, ``distinct`` valeurs possibles."""
+    numbers = pd.Series(rng.integers(1, distinct + 1, n))
+    return (prefix + numbers.astype(str).str.zfill(width)).to_numpy(dtype=object)
+
+
+def _pick(rng, n, values, missing=0.0):
+    values = np.asarray(values, dtype=object)
+    picked = values[rng.integers(0, len(values), n)]
+    if missing:
+        picked[rng.random(n) < missing] = None
+    return picked
+
+
+def _names(prefix, count):
+    return [f"{prefix}{i:03d}" for i in range(1, count + 1)]
+
+
+def generate_extract(n_rows, seed=0):
+    """Construit un DataFrame synthétique de ``n_rows`` lignes, au format de l'extrait PeopleSoft."""
+    rng = np.random.default_rng(seed)
+    n = int(n_rows)
+    # Environ trois lignes d'articles par réquisition, comme dans les extraits réels
+    n_requisitions = max(n // 3, 1)
+    depts = list(DEPT_MAPPING) + ["CD0099"]
+    dept_weights = np.r_[np.full(len(DEPT_MAPPING), 0.99 / len(DEPT_MAPPING)), 0.01]
+
+    quantity_ordered = rng.integers(1, 500, n)
+    quantity_received = np.minimum(quantity_ordered, rng.integers(0, 550, n))
+    df = pd.DataFrame({
+        'Requisition ID': _ids(rng, n, n_requisitions),
+        'PR Item': rng.integers(1, 8, n),
+        'RFQ ID': rng.integers(1, max(n // 4, 2), n),
+        'PO No.': rng.integers(1, max(n // 4, 2), n),
+        'Receipt Nbr': rng.integers(1, max(n // 5, 2), n),
+        'Voucher ID': _ids(rng, n, max(n // 5, 1), width=8),
+        'Vch Pymt Ref': rng.integers(1, max(n // 6, 2), n),
+        'Dept ID': rng.choice(depts, n, p=dept_weights).astype(object),
+        'Fund Code': _pick(rng, n, _names("F", 60)),
+        'Project ID': _pick(rng, n, _names("PRJ", 250)),
+        'PO Buyer': _pick(rng, n, _names("BUYER", 25), missing=0.05),
+        'PR Status': _pick(rng, n, PR_STATUSES),
+        'PO Status': _pick(rng, n, PO_STATUSES, missing=0.1),
+        'Currency': _pick(rng, n, CURRENCIES),
+        'Threshold 1': _pick(rng, n, ['< 5 000', '5 000 - 25 000', '> 25 000'], missing=0.2),
+        'Threshold 2': _pick(rng, n, ['Y', 'N'], missing=0.2),
+        'Threshold 3': _pick(rng, n, ['Y', 'N'], missing=0.2),
+        'Vch Last Approver': _pick(rng, n, _names("FIN", 15)),
+        'PO Last Approver': _pick(rng, n, _names("MGR", 20)),
+        'Vch Data Entered By': _pick(rng, n, _names("AP", 12)),
+        'Rcpt Data Entered By': _pick(rng, n, _names("WH", 30)),
+        'PR-Year': rng.integers(2019, 2026, n),
+        'PR-Month': rng.integers(1, 13, n),
+        'Quantity Ordered': quantity_ordered,
+        'Quantity Received': quantity_received,
+        'Balance Pending to be Rcvd': quantity_ordered - quantity_received,
+        'Item Total': np.round(rng.gamma(2.0, 800.0, n), 2),
+    })
+    for col in DAY_COUNT_COLUMNS:
+        days = np.round(rng.gamma(2.0, 12.0, n))
+        days[rng.random(n) < 0.1] = np.nan
+        df[col] = days
+    return df[REQUIRED_COLUMNS]
+
+
+def write_extract(df, path):
+    """Écrit l'extrait au format déduit de l'extension (csv, xlsx ou parquet)."""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == '.csv':
+        df.to_csv(path, index=False)
+    elif suffix == '.parquet':
+        df.to_parquet(path, index=False)
+    elif suffix == '.xlsx':
+        if len(df) > EXCEL_MAX_ROWS:
+            raise ValueError(f"Excel est limité à {EXCEL_MAX_ROWS} lignes ; utilisez le format CSV")
+        df.to_excel(path, index=False)
+    else:
+        raise ValueError(f"Format non pris en charge : {suffix}")
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m procurement.synthetic",
+                                     description="Génère un extrait PeopleSoft synthétique.")
+    parser.add_argument("rows", type=int, help="nombre de lignes (10 000 à 5 000 000)")
+    parser.add_argument("output", help="fichier de sortie (.csv, .xlsx ou .parquet)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    try:
+        print(write_extract(generate_extract(args.rows, args.seed), args.output))
+    except (OSError, ValueError) as exc:
+        print(f"Erreur : {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())